@@ -0,0 +1,218 @@
+"""
+Offline benchmark for the upload -> translate -> page fetch -> export pipeline.
+
+Runs the real FastAPI app against FakeTranslator and InMemoryFirestore, so no
+network access or credentials are needed. Usage (from backend/):
+
+    python -m benchmarks.bench_pipeline --rows 1000 10000 --duplication 0.5 --markup 0.2
+
+Reports throughput, p50/p99 latency and peak traced memory per stage.
+Memory tracing slows Python down noticeably, so it is only done with
+--memory; throughput numbers from such runs are not comparable with runs
+without it. Pass --output to also append the report to a file.
+"""
+import argparse
+import io
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fakes import FakeTranslatorFactory, InMemoryFirestore
+
+WORDS = ("dataset translation model token prompt answer question review quality "
+         "language system value column row export upload user assistant").split()
+
+
+def make_text(rng, markup):
+    words = rng.randint(5, 40)
+    text = " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+    if rng.random() < markup:
+        text += rng.choice([
+            " Use `print(x)` here.",
+            "\n```python\nx = 1\n```\nDone.",
+            " $$E = mc^2$$ holds.",
+        ])
+    if rng.random() < 0.3:
+        text += "\n" + text
+    return text
+
+
+def make_csv(rows, duplication, markup, seed=0):
+    """
+    Builds a CSV with an id column and two text columns. `duplication` is the
+    share of cells that repeat an earlier value.
+    """
+    import pandas as pd
+
+    rng = random.Random(seed)
+    pool = []
+    data = []
+    for i in range(rows):
+        row = {"id": i}
+        for col in ("instruction", "output"):
+            if pool and rng.random() < duplication:
+                row[col] = rng.choice(pool)
+            else:
+                row[col] = make_text(rng, markup)
+                pool.append(row[col])
+        data.append(row)
+    buffer = io.StringIO()
+    pd.DataFrame(data).to_csv(buffer, index=False)
+    return buffer.getvalue().encode("utf-8")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Stage:
+    trace_memory = False
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.items = 0
+        self.peak_memory = 0
+        self.wall = 0.0
+
+    def run(self, func, repeat=1):
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        result = None
+        for _ in range(repeat):
+            call_started = time.perf_counter()
+            result = func()
+            self.latencies.append(time.perf_counter() - call_started)
+        self.wall += time.perf_counter() - started
+        if self.trace_memory:
+            self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        return result
+
+    def row(self):
+        throughput = self.items / self.wall if self.wall else 0.0
+        return (f"{self.name:<10} {self.items:>9} {throughput:>12.1f} "
+                f"{percentile(self.latencies, 50) * 1000:>10.1f} {percentile(self.latencies, 99) * 1000:>10.1f} "
+                f"{self.peak_memory / 1e6:>9.1f}")
+
+
+HEADER = f"{'stage':<10} {'items':>9} {'items/s':>12} {'p50 ms':>10} {'p99 ms':>10} {'peak MB':>9}"
+
+
+def run_scenario(client, args, rows, duplication, markup):
+    from translation_service import translation_service
+
+    csv_bytes = make_csv(rows, duplication, markup)
+    stages = []
+
+    upload = Stage("upload")
+    response = upload.run(lambda: client.post(
+        "/upload", files={"file": ("bench.csv", csv_bytes, "text/csv")}))
+    response.raise_for_status()
+    dataset_id = response.json()["dataset_id"]
+    upload.items = rows
+    stages.append(upload)
+
+    # Start every scenario with a cold cache and fresh backend counters
+    translation_service.cache.clear()
+    factory = FakeTranslatorFactory(args.latency, args.error_rate)
+    translation_service.translator_factory = factory
+
+    translate = Stage("translate")
+    body = {"dataset_id": dataset_id, "rows": list(range(rows)), "columns": ["instruction", "output"]}
+    # TestClient runs background tasks before returning, so this times the whole job
+    translate.run(lambda: client.post("/translate", json=body).raise_for_status())
+    translate.items = rows * 2
+    # Per-call latency of the backend rather than of the single job
+    translate.latencies = factory.latencies
+    stages.append(translate)
+
+    page = Stage("page")
+    pages = max(1, rows // args.limit)
+    page.run(lambda: client.get(f"/dataset/{dataset_id}",
+                                params={"page": random.randint(1, pages), "limit": args.limit}).raise_for_status(),
+             repeat=args.page_repeat)
+    page.items = args.page_repeat * min(args.limit, rows)
+    stages.append(page)
+
+    export = Stage("export")
+    response = export.run(lambda: client.get(f"/export/{dataset_id}"), repeat=3)
+    response.raise_for_status()
+    export.items = rows * 3
+    stages.append(export)
+
+    extra = {
+        "backend_calls": factory.calls,
+        "backend_errors": factory.errors,
+        "export_bytes": len(response.content),
+    }
+    return stages, extra
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--duplication", type=float, nargs="+", default=[0.0, 0.5])
+    parser.add_argument("--markup", type=float, nargs="+", default=[0.2])
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake backend latency per call (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of backend calls that fail")
+    parser.add_argument("--store-latency", type=float, default=0.0, help="Fake Firestore latency per round trip (s)")
+    parser.add_argument("--page-repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--memory", action="store_true", help="Trace peak memory per stage (slow)")
+    parser.add_argument("--output", help="Append the report to this file")
+    args = parser.parse_args(argv)
+
+    from fastapi.testclient import TestClient
+    import main as app_module
+    from firebase_service import firebase_service
+    from progress_tracker import progress_tracker
+    from translation_service import translation_service
+
+    firebase_service.db = InMemoryFirestore(latency=args.store_latency)
+    storage_dir = tempfile.mkdtemp()
+    progress_tracker.storage_file = os.path.join(storage_dir, "progress.json")
+    progress_tracker.failures_file = os.path.join(storage_dir, "progress.failed.json")
+    progress_tracker.tasks = {}
+    progress_tracker.failures = {}
+    Stage.trace_memory = args.memory
+    # Keep pacing proportional to the fake backend instead of the real one
+    translation_service.JITTER_SECONDS = (0, 0)
+    translation_service.BACKOFF_SECONDS = args.latency
+
+    client = TestClient(app_module.app)
+    report = []
+    for rows in args.rows:
+        for duplication in args.duplication:
+            for markup in args.markup:
+                stages, extra = run_scenario(client, args, rows, duplication, markup)
+                report.append(f"\n# rows={rows} duplication={duplication} markup={markup} "
+                              f"latency={args.latency}s error_rate={args.error_rate} "
+                              f"backend_calls={extra['backend_calls']} backend_errors={extra['backend_errors']} "
+                              f"export_bytes={extra['export_bytes']} "
+                              f"max_rss_mb={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}")
+                report.append(HEADER)
+                report.extend(stage.row() for stage in stages)
+
+    text = "\n".join(report)
+    print(text)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Offline stand-ins for the translation backend and Firestore.
+
+FakeTranslator mimics deep_translator's GoogleTranslator with configurable
+latency and error rate. InMemoryFirestore implements the subset of the
+firestore client API used by FirebaseService, so the real service code runs
+unchanged against it.
+"""
+import copy
+import random
+import threading
+import time
+import uuid
+
+
+class FakeTranslator:
+    def __init__(self, target='vi', latency=0.05, error_rate=0.0, jitter=0.0):
+        self.target = target
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.latencies = []
+        self.calls = 0
+        self.errors = 0
+
+    def translate(self, text):
+        started = time.perf_counter()
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        self.calls += 1
+        if random.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError("Simulated backend error")
+        self.latencies.append(time.perf_counter() - started)
+        return f"[{self.target}] {text}"
+
+
+class FakeTranslatorFactory:
+    """
+    Callable used as TranslationService.translator_factory. Keeps every
+    translator it creates so call counts and latencies can be collected.
+    """
+    def __init__(self, latency=0.05, error_rate=0.0, jitter=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.translators = []
+        self.lock = threading.Lock()
+
+    def __call__(self, target):
+        translator = FakeTranslator(target, self.latency, self.error_rate, self.jitter)
+        with self.lock:
+            self.translators.append(translator)
+        return translator
+
+    @property
+    def calls(self):
+        return sum(t.calls for t in self.translators)
+
+    @property
+    def errors(self):
+        return sum(t.errors for t in self.translators)
+
+    @property
+    def latencies(self):
+        return [l for t in self.translators for l in t.latencies]
+
+
+# --- Firestore stand-in ---
+
+class _Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class _DocumentRef:
+    def __init__(self, db, path):
+        self._db = db
+        self._path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return _CollectionRef(self._db, self._path + (name,))
+
+    def get(self):
+        self._db.io("read")
+        with self._db.lock:
+            return _Snapshot(self.id, self._db.docs.get(self._path))
+
+    def set(self, data, merge=False):
+        self._db.io("write")
+        with self._db.lock:
+            self._db.write(self._path, data, merge)
+
+    def update(self, data):
+        self._db.io("write")
+        with self._db.lock:
+            if self._path not in self._db.docs:
+                raise KeyError(f"No document to update: {'/'.join(self._path)}")
+            self._db.write(self._path, data, merge=True)
+
+    def delete(self):
+        self._db.io("write")
+        with self._db.lock:
+            self._db.docs.pop(self._path, None)
+
+
+class _Query:
+    OPERATORS = {
+        "==": lambda a, b: a == b,
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b,
+    }
+
+    def __init__(self, collection, order=None, limit=None, fields=None, filters=None):
+        self._collection = collection
+        self._order = order or []
+        self._limit = limit
+        self._fields = fields
+        self._filters = filters or []
+
+    def _with(self, **changes):
+        args = {"order": self._order, "limit": self._limit, "fields": self._fields, "filters": self._filters}
+        args.update(changes)
+        return _Query(self._collection, **args)
+
+    def where(self, field, op, value):
+        return self._with(filters=self._filters + [(field, self.OPERATORS[op], value)])
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._with(order=self._order + [(field, direction)])
+
+    def limit(self, count):
+        return self._with(limit=count)
+
+    def select(self, field_paths):
+        return self._with(fields=list(field_paths))
+
+    def stream(self):
+        snapshots = list(self._collection._snapshots())
+        # Like Firestore, documents without the field never match
+        for field, compare, value in self._filters:
+            snapshots = [s for s in snapshots if s._data.get(field) is not None and compare(s._data[field], value)]
+        for field, direction in reversed(self._order):
+            snapshots.sort(key=lambda s: s._data.get(field), reverse=direction == "DESCENDING")
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+        if self._fields is not None:
+            snapshots = [_Snapshot(s.id, {k: v for k, v in s._data.items() if k in self._fields})
+                         for s in snapshots]
+        return iter(snapshots)
+
+
+class _CollectionRef(_Query):
+    def __init__(self, db, path):
+        super().__init__(self)
+        self._db = db
+        self._path = path
+
+    def document(self, doc_id=None):
+        return _DocumentRef(self._db, self._path + (doc_id or uuid.uuid4().hex[:20],))
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return time.time(), ref
+
+    def _snapshots(self):
+        self._db.io("read")
+        depth = len(self._path) + 1
+        with self._db.lock:
+            items = [(path, data) for path, data in self._db.docs.items()
+                     if len(path) == depth and path[:-1] == self._path]
+        return [_Snapshot(path[-1], data) for path, data in items]
+
+
+class _Batch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append((ref._path, data, merge))
+
+    def delete(self, ref):
+        self._writes.append((ref._path, None, False))
+
+    def commit(self):
+        self._db.io("write", len(self._writes))
+        with self._db.lock:
+            for path, data, merge in self._writes:
+                if data is None:
+                    self._db.docs.pop(path, None)
+                else:
+                    self._db.write(path, data, merge)
+        self._writes = []
+
+
+class InMemoryFirestore:
+    """
+    Minimal in-memory replacement for firestore.client(). Documents are kept
+    in a flat dict keyed by their path tuple. An optional latency is added to
+    every read and write to approximate a remote store.
+    """
+    def __init__(self, latency=0.0):
+        self.docs = {}
+        self.lock = threading.RLock()
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+
+    def collection(self, name):
+        return _CollectionRef(self, (name,))
+
+    def batch(self):
+        return _Batch(self)
+
+    def io(self, kind, count=1):
+        # One round trip: counted per document, delayed once
+        if kind == "read":
+            self.reads += count
+        else:
+            self.writes += count
+        if self.latency:
+            time.sleep(self.latency)
+
+    def write(self, path, data, merge=False):
+        data = copy.deepcopy(data)
+        old = self.docs.get(path, {}) if merge else {}
+        for key, value in data.items():
+            # firestore.Increment transform
+            if type(value).__name__ == "Increment":
+                data[key] = old.get(key, 0) + value.value
+        if merge and path in self.docs:
+            self.docs[path].update(data)
+        else:
+            self.docs[path] = data
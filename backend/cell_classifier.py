@@ -0,0 +1,145 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# Optional offline language-ID model (fastText lid.176)
+try:
+    import fasttext
+except ImportError:
+    fasttext = None
+
+class CellClassifier:
+    """
+    Cheap local checks that run before dispatch, one column at a time, to keep
+    cells that need no translation away from the backend.
+    """
+    # Skip reasons, checked in this order
+    NUMBER = re.compile(r'(?=\D*\d)[-+]?[\d\s.,:/%]+')
+    URL = re.compile(r'(?:https?://|ftp://|www\.)\S+')
+    EMAIL = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+    # One token made of word characters and separators that contains a digit,
+    # e.g. UUIDs, hashes, "item_0042", "SKU-12/B"
+    IDENTIFIER = re.compile(r'(?=\S*\d)[\w\-:/.#]+')
+    # ...that also looks machine-made rather than like a name ("COVID-19", "Python3"):
+    # a separator, several digits, or no run of three letters
+    ID_SEPARATORS = r'[_/#:]'
+    ID_MIN_DIGITS = 3
+    LETTER_RUN = r'[^\W\d_]{3}'
+    CODE_BLOCK = re.compile(r'\s*```[\s\S]*```\s*')
+    # Statement syntax only: parentheses, brackets, $, < and > are common in prose
+    CODE_CHARS = r'[{};=|&\\]'
+    CODE_DENSITY = 0.12
+    # Text with this many words of 3+ letters is prose, whatever its symbols
+    PROSE_WORD = r'[^\W\d_]{3,}'
+    MIN_PROSE_WORDS = 4
+
+    # Language ID
+    MODEL_PATH = os.getenv("LANGID_MODEL_PATH", os.path.join("model", "lid.176.ftz"))
+    MIN_LANGID_CHARS = 20
+    MIN_LANGID_CONFIDENCE = 0.8
+    # Heuristic used without a model: most Vietnamese words carry a diacritic,
+    # and some letters are only used by Vietnamese
+    VI_LETTERS = r'[àáảãạăằắẳẵặâầấẩẫậđèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵ]'
+    VI_ONLY_LETTERS = r'[ăđơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ]'
+    VI_MIN_WORD_RATIO = 0.5
+
+    def __init__(self):
+        self.model = None
+        if fasttext and os.path.exists(self.MODEL_PATH):
+            try:
+                self.model = fasttext.load_model(self.MODEL_PATH)
+                print(f"Language ID model loaded from {self.MODEL_PATH}")
+            except Exception as e:
+                print(f"Error loading language ID model: {e}")
+
+    def classify_values(self, values):
+        """
+        Returns a Series aligned with values holding the skip reason of each
+        cell ('number', 'url', 'email', 'id', 'code') or '' if it needs translation.
+        """
+        text = values.astype(str).str.strip()
+        lengths = text.str.len().replace(0, 1)
+        code_density = text.str.count(self.CODE_CHARS) / lengths
+        prose_words = text.str.count(self.PROSE_WORD)
+
+        identifier = text.str.fullmatch(self.IDENTIFIER.pattern) & (
+            text.str.contains(self.ID_SEPARATORS)
+            | (text.str.count(r'\d') >= self.ID_MIN_DIGITS)
+            | ~text.str.contains(self.LETTER_RUN)
+        )
+        code = text.str.fullmatch(self.CODE_BLOCK.pattern) | (
+            (code_density > self.CODE_DENSITY) & (lengths > 10) & (prose_words < self.MIN_PROSE_WORDS)
+        )
+
+        conditions = [
+            text.str.fullmatch(self.NUMBER.pattern),
+            text.str.fullmatch(self.URL.pattern),
+            text.str.fullmatch(self.EMAIL.pattern),
+            identifier,
+            code,
+        ]
+        reasons = ['number', 'url', 'email', 'id', 'code']
+        return pd.Series(np.select(conditions, reasons, default=''), index=values.index)
+
+    def detect_languages(self, values):
+        """
+        Returns a Series with the detected language code of each cell, or ''
+        when the text is too short or detection is not confident.
+        """
+        text = values.astype(str).str.strip()
+        langs = pd.Series('', index=values.index)
+        long_enough = text.str.len() >= self.MIN_LANGID_CHARS
+        if not long_enough.any():
+            return langs
+
+        candidates = text[long_enough]
+        if self.model is not None:
+            labels, probs = self.model.predict(candidates.str.replace('\n', ' ').tolist(), k=1)
+            detected = [
+                label[0].replace('__label__', '') if prob[0] >= self.MIN_LANGID_CONFIDENCE else ''
+                for label, prob in zip(labels, probs)
+            ]
+            langs[long_enough] = detected
+        else:
+            lower = candidates.str.lower()
+            words = lower.str.count(r'[^\W\d_]+').replace(0, 1)
+            vi_words = lower.str.count(r'[^\W\d_]*' + self.VI_LETTERS + r'[^\W\d_]*')
+            is_vi = (vi_words / words >= self.VI_MIN_WORD_RATIO) & lower.str.contains(self.VI_ONLY_LETTERS)
+            langs[long_enough] = np.where(is_vi, 'vi', '')
+        return langs
+
+    def classify(self, df, rows, columns):
+        """
+        Classifies the selected cells column by column.
+        Returns (skipped, languages, skipped_columns):
+          skipped: {(row, col): reason} for cells no target needs
+          languages: {(row, col): lang} for the other cells whose language was detected
+          skipped_columns: columns where every selected non-blank cell is skipped
+        """
+        valid_rows = [r for r in rows if r < len(df)]
+        skipped = {}
+        languages = {}
+        skipped_columns = []
+        for col in columns:
+            if col not in df.columns or not valid_rows:
+                continue
+            values = df.loc[valid_rows, col].astype(str)
+            values = values[values.str.strip() != '']
+            if values.empty:
+                continue
+
+            reasons = self.classify_values(values)
+            for row, reason in reasons[reasons != ''].items():
+                skipped[(row, col)] = reason
+            if (reasons != '').all():
+                skipped_columns.append(col)
+                continue
+
+            langs = self.detect_languages(values[reasons == ''])
+            for row, lang in langs[langs != ''].items():
+                languages[(row, col)] = lang
+        return skipped, languages, skipped_columns
+
+# Singleton
+cell_classifier = CellClassifier()
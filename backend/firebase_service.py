@@ -1,18 +1,42 @@
+import atexit
 import os
 import json
+import threading
+import time
 import firebase_admin
 from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
 import datetime
+import hashlib
+import uuid
+import metrics
+from search_index import search_index
 
 # Load environment variables
 load_dotenv()
 
 class FirebaseService:
+    # How often version bumps are written to the dataset meta (seconds)
+    VERSION_FLUSH_INTERVAL = 1.0
+
     def __init__(self):
         self.db = None
+        # dataset_id -> version bumps not written to the meta document yet
+        self.pending_versions = {}
+        # Tells this process's versions apart from those of an earlier one
+        # that died with bumps still pending (see version_tag)
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version_lock = threading.Lock()
+        # Held by a flush from its Increment until its bumps leave
+        # pending_versions, and by readers around the stored version
+        self.version_flush_lock = threading.Lock()
+        self.versions_dirty = threading.Event()
         self.initialize()
 
+        self.version_flusher = threading.Thread(target=self._flush_versions_loop, name="version-flusher", daemon=True)
+        self.version_flusher.start()
+        atexit.register(self.flush_versions)
+
     def initialize(self):
         try:
             if not firebase_admin._apps:
@@ -34,6 +58,7 @@ class FirebaseService:
             self.db = None
 
     # --- DATASET OPERATIONS ---
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="create_dataset")
     def create_dataset(self, filename, columns, file_type='csv'):
         if not self.db: return None
         
@@ -49,9 +74,11 @@ class FirebaseService:
             })
             return dataset_id
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="create_dataset")
             print(f"Error creating dataset: {e}")
             return None
 
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="get_dataset_meta")
     def get_dataset_meta(self, dataset_id):
         if not self.db: return None
         try:
@@ -60,9 +87,154 @@ class FirebaseService:
                 return doc.to_dict()
             return None
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="get_dataset_meta")
             print(f"Error getting dataset meta: {e}")
             return None
 
+    # --- DATASET VERSIONS ---
+    def bump_version(self, dataset_id, count=1):
+        """
+        Marks a dataset as changed (see get_version). Bumps are counted in
+        memory and added to the meta "version" field by a background flusher,
+        so single-cell writes don't contend on the meta document. Batched
+        writes store their bump with the batch instead (see _commit_versioned).
+        """
+        with self.version_lock:
+            self.pending_versions[dataset_id] = self.pending_versions.get(dataset_id, 0) + count
+        self.versions_dirty.set()
+        search_index.advance(dataset_id, count)
+
+    def get_version(self, dataset_id):
+        """
+        Current version of a dataset: the stored one plus local bumps that
+        are not flushed yet. Both are read under version_flush_lock, so a
+        concurrent flush is counted exactly once and the version never goes
+        backwards.
+        """
+        with self.version_flush_lock:
+            stored = 0
+            if self.db:
+                snapshot = self.db.collection("datasets").document(dataset_id).get()
+                stored = (snapshot.to_dict() or {}).get("version", 0) if snapshot.exists else 0
+            with self.version_lock:
+                pending = self.pending_versions.get(dataset_id, 0)
+        return stored + pending
+
+    def version_tag(self, dataset_id):
+        """
+        Version for ETags. Bumps still pending die with the process, and the
+        next one would count the same numbers again over different content,
+        so the tag also carries the process epoch.
+        """
+        return f"{self.get_version(dataset_id)}.{self.epoch}"
+
+    def _commit_versioned(self, batch, dataset_id):
+        """
+        Commits a batch of cell writes together with a bump of the dataset
+        version, so the bump is stored (or lost) with the cells it covers.
+        """
+        batch.set(self.db.collection("datasets").document(dataset_id),
+                  {"version": firestore.Increment(1)}, merge=True)
+        batch.commit()
+        search_index.advance(dataset_id)
+
+    def flush_versions(self):
+        with self.version_lock:
+            self.versions_dirty.clear()
+            pending = dict(self.pending_versions)
+        if not self.db:
+            return
+        for dataset_id, count in pending.items():
+            # Storing the bumps and dropping them from pending_versions is one
+            # step for get_version, which would otherwise count them twice or not at all
+            with self.version_flush_lock:
+                try:
+                    self.db.collection("datasets").document(dataset_id).update({"version": firestore.Increment(count)})
+                except Exception as e:
+                    metrics.FIRESTORE_ERRORS.inc(op="flush_versions")
+                    print(f"Error saving dataset version: {e}")
+                    self.versions_dirty.set()
+                    continue
+                with self.version_lock:
+                    left = self.pending_versions.get(dataset_id, 0) - count
+                    if left > 0:
+                        self.pending_versions[dataset_id] = left
+                    else:
+                        self.pending_versions.pop(dataset_id, None)
+
+    def _flush_versions_loop(self):
+        while True:
+            self.versions_dirty.wait()
+            time.sleep(self.VERSION_FLUSH_INTERVAL)
+            self.flush_versions()
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="add_columns")
+    def add_columns(self, dataset_id, keys):
+        """
+        Appends grid columns (e.g. per-language outputs) missing from the dataset meta.
+        """
+        if not self.db: return
+        try:
+            doc_ref = self.db.collection("datasets").document(dataset_id)
+            snapshot = doc_ref.get()
+            if not snapshot.exists:
+                return
+            columns = snapshot.to_dict().get("columns", [])
+            existing = {col["key"] for col in columns}
+            new_columns = [{
+                "key": key,
+                "label": key,
+                "width": "300px",
+                "editable": True,
+                "output": True
+            } for key in keys if key not in existing]
+            if new_columns:
+                doc_ref.update({"columns": columns + new_columns})
+                self.bump_version(dataset_id)
+        except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="add_columns")
+            print(f"Error adding columns: {e}")
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="record_translation")
+    def record_translation(self, dataset_id, columns, target_languages=None):
+        """
+        Remembers how each column of a dataset is translated (in place and/or
+        to which languages), so new revisions can re-translate their changed
+        cells the same way.
+        """
+        if not self.db: return
+        try:
+            doc_ref = self.db.collection("datasets").document(dataset_id)
+            snapshot = doc_ref.get()
+            if not snapshot.exists:
+                return
+            translated = self.translated_columns(snapshot.to_dict())
+            for col in columns:
+                entry = translated.setdefault(col, {"in_place": False, "target_languages": []})
+                if target_languages:
+                    entry["target_languages"] = list(dict.fromkeys(entry["target_languages"] + list(target_languages)))
+                else:
+                    entry["in_place"] = True
+            doc_ref.update({"translation": {"columns": translated}})
+        except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="record_translation")
+            print(f"Error recording translation: {e}")
+
+    @staticmethod
+    def translated_columns(meta):
+        """
+        Per-column translation record of a dataset's metadata:
+        {source column: {"in_place": bool, "target_languages": [...]}}.
+        """
+        translation = (meta or {}).get("translation") or {}
+        columns = translation.get("columns") or {}
+        if isinstance(columns, list):
+            # Older records: one language setting for every column
+            languages = translation.get("target_languages") or []
+            columns = {col: {"in_place": not languages, "target_languages": list(languages)} for col in columns}
+        return {col: dict(entry) for col, entry in columns.items()}
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="save_cells")
     def save_cells(self, dataset_id, df):
         """
         Batch save initial cells to Firestore.
@@ -73,6 +245,9 @@ class FirebaseService:
         try:
             batch = self.db.batch()
             count = 0
+            versions = 0
+            now = datetime.datetime.now()
+            indexed = []
             
             # Convert DataFrame to list of dicts for iteration
             # We'll use a composite ID: {row_idx}_{col_key}
@@ -84,26 +259,216 @@ class FirebaseService:
                     doc_ref = self.db.collection("datasets").document(dataset_id)\
                                      .collection("cells").document(f"{row_idx}_{col}")
                     
-                    batch.set(doc_ref, {
+                    cell = {
                         "row_idx": row_idx,
                         "col_key": col,
-                        "value": val
-                    })
+                        "value": val,
+                        "source_hash": self.content_hash(val),
+                        "updated_at": now
+                    }
+                    batch.set(doc_ref, cell)
+                    indexed.append(cell)
                     
                     count += 1
                     if count >= 400: # Safe margin
-                        batch.commit()
+                        metrics.FIRESTORE_BATCH_SIZE.observe(count)
+                        self._commit_versioned(batch, dataset_id)
+                        versions += 1
                         batch = self.db.batch()
                         count = 0
             
             if count > 0:
-                batch.commit()
-                
+                metrics.FIRESTORE_BATCH_SIZE.observe(count)
+                self._commit_versioned(batch, dataset_id)
+                versions += 1
+            
+            search_index.build(dataset_id, indexed, version=versions) # New dataset: one bump per batch
             print(f"Saved {len(df)} rows to Firestore.")
             
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="save_cells")
             print(f"Error saving cells: {e}")
 
+    @staticmethod
+    def content_hash(value):
+        return hashlib.sha1(str(value).encode('utf-8')).hexdigest()
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="get_cell_hashes")
+    def get_cell_hashes(self, dataset_id):
+        """
+        Returns {(row_idx, col_key): source_hash} for every cell, reading only
+        those fields. Cells without a source hash (translation outputs, or
+        datasets uploaded before hashing) map to None.
+        """
+        if not self.db: return {}
+        
+        try:
+            docs = self.db.collection("datasets").document(dataset_id)\
+                          .collection("cells").select(["row_idx", "col_key", "source_hash"]).stream()
+            
+            hashes = {}
+            for doc in docs:
+                cell = doc.to_dict()
+                hashes[(cell['row_idx'], cell['col_key'])] = cell.get('source_hash')
+            return hashes
+        except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="get_cell_hashes")
+            print(f"Error getting cell hashes: {e}")
+            return {}
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="save_revision")
+    def save_revision(self, dataset_id, df, columns, filename=None):
+        """
+        Applies a new revision of a dataset's source file. Only cells whose
+        content hash changed are written, so translations of unchanged cells
+        are kept. Cells of rows or source columns missing from the revision
+        are deleted.
+        Returns (changed, unchanged_count, removed_count) where changed is a
+        list of (row_idx, col_key), or None on failure.
+        """
+        if not self.db: return None
+        
+        try:
+            old_hashes = self.get_cell_hashes(dataset_id)
+            dataset_ref = self.db.collection("datasets").document(dataset_id)
+            cells_ref = dataset_ref.collection("cells")
+            
+            batch = self.db.batch()
+            count = 0
+            changed = []
+            seen = set()
+            now = datetime.datetime.now()
+            for row_idx, row in df.iterrows():
+                for col in df.columns:
+                    val = str(row[col])
+                    source_hash = self.content_hash(val)
+                    seen.add((row_idx, col))
+                    if old_hashes.get((row_idx, col)) == source_hash:
+                        continue
+                    
+                    batch.set(cells_ref.document(f"{row_idx}_{col}"), {
+                        "row_idx": row_idx,
+                        "col_key": col,
+                        "value": val,
+                        "source_hash": source_hash,
+                        "updated_at": now
+                    })
+                    search_index.update(dataset_id, row_idx, col, val, now, source_hash)
+                    changed.append((row_idx, col))
+                    count += 1
+                    if count >= 400: # Safe margin
+                        metrics.FIRESTORE_BATCH_SIZE.observe(count)
+                        self._commit_versioned(batch, dataset_id)
+                        batch = self.db.batch()
+                        count = 0
+            
+            # Drop removed rows entirely, and source cells of removed columns
+            removed = 0
+            for (row_idx, col), source_hash in old_hashes.items():
+                if (row_idx, col) in seen:
+                    continue
+                if row_idx < len(df) and source_hash is None:
+                    continue # translation output of a row that still exists
+                batch.delete(cells_ref.document(f"{row_idx}_{col}"))
+                search_index.remove(dataset_id, row_idx, col)
+                removed += 1
+                count += 1
+                if count >= 400:
+                    metrics.FIRESTORE_BATCH_SIZE.observe(count)
+                    self._commit_versioned(batch, dataset_id)
+                    batch = self.db.batch()
+                    count = 0
+            
+            if count > 0:
+                metrics.FIRESTORE_BATCH_SIZE.observe(count)
+                self._commit_versioned(batch, dataset_id)
+            
+            # Keep output columns that are not part of the source file
+            meta = dataset_ref.get().to_dict() or {}
+            source_keys = {col["key"] for col in columns}
+            output_columns = [col for col in meta.get("columns", [])
+                              if col.get("output") and col["key"] not in source_keys]
+            update = {"columns": columns + output_columns, "revision": meta.get("revision", 1) + 1,
+                      "version": firestore.Increment(1)}
+            if filename:
+                update["filename"] = filename
+            dataset_ref.update(update)
+            search_index.advance(dataset_id)
+            
+            unchanged = len(seen) - len(changed)
+            print(f"Revision of {dataset_id}: {len(changed)} changed, {unchanged} unchanged, {removed} removed cells.")
+            return changed, unchanged, removed
+            
+        except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="save_revision")
+            print(f"Error saving revision: {e}")
+            return None
+
+    # Firestore documents are limited to 1 MiB, counted in UTF-8 bytes
+    SKELETON_CHUNK_BYTES = 900000
+
+    @staticmethod
+    def split_utf8(text, max_bytes):
+        """
+        Splits text into pieces of at most max_bytes UTF-8 bytes, never
+        inside a character.
+        """
+        data = text.encode("utf-8")
+        chunks = []
+        start = 0
+        while start < len(data):
+            end = min(start + max_bytes, len(data))
+            # Back off continuation bytes (10xxxxxx) to the start of a character
+            while end < len(data) and (data[end] & 0xC0) == 0x80:
+                end -= 1
+            chunks.append(data[start:end].decode("utf-8"))
+            start = end
+        return chunks or [""]
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="save_skeleton")
+    def save_skeleton(self, dataset_id, selectors, skeleton):
+        """
+        Stores the non-selected part of a path-selective JSON upload, as JSON
+        text split over datasets/{id}/skeleton/{n} documents.
+        """
+        if not self.db: return
+        try:
+            dataset_ref = self.db.collection("datasets").document(dataset_id)
+            text = json.dumps(skeleton, ensure_ascii=False)
+            chunks = self.split_utf8(text, self.SKELETON_CHUNK_BYTES)
+            
+            previous = (dataset_ref.get().to_dict() or {}).get("skeleton_chunks", 0)
+            # Chunks are close to the document limit: write them one at a time
+            for i, chunk in enumerate(chunks):
+                dataset_ref.collection("skeleton").document(str(i)).set({"data": chunk})
+            for i in range(len(chunks), previous):
+                dataset_ref.collection("skeleton").document(str(i)).delete()
+            
+            dataset_ref.update({"json_paths": list(selectors), "skeleton_chunks": len(chunks)})
+            self.bump_version(dataset_id)
+        except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="save_skeleton")
+            print(f"Error saving skeleton: {e}")
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="get_skeleton")
+    def get_skeleton(self, dataset_id):
+        if not self.db: return None
+        try:
+            dataset_ref = self.db.collection("datasets").document(dataset_id)
+            count = (dataset_ref.get().to_dict() or {}).get("skeleton_chunks", 0)
+            if not count:
+                return None
+            parts = []
+            for i in range(count):
+                snapshot = dataset_ref.collection("skeleton").document(str(i)).get()
+                parts.append(snapshot.to_dict()["data"])
+            return json.loads("".join(parts))
+        except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="get_skeleton")
+            print(f"Error getting skeleton: {e}")
+            return None
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="get_cells")
     def get_cells(self, dataset_id, limit=1000):
         """
         Fetch all cells for a dataset. 
@@ -122,9 +487,29 @@ class FirebaseService:
             
             return cells
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="get_cells")
             print(f"Error getting cells: {e}")
             return []
 
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="get_changed_cells")
+    def get_changed_cells(self, dataset_id, since):
+        """
+        Fetch the cells written at or after since (unix time), e.g. by shard
+        workers. Returns None on errors.
+        """
+        if not self.db: return None
+        
+        try:
+            docs = self.db.collection("datasets").document(dataset_id)\
+                          .collection("cells")\
+                          .where("updated_at", ">=", datetime.datetime.fromtimestamp(since)).stream()
+            return [doc.to_dict() for doc in docs]
+        except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="get_changed_cells")
+            print(f"Error getting changed cells: {e}")
+            return None
+
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="update_cell")
     def update_cell(self, dataset_id, row_idx, col_key, new_value):
         if not self.db: return
         
@@ -148,47 +533,99 @@ class FirebaseService:
                        "timestamp": datetime.datetime.now()
                    })
             
-            # 3. Update Cell
+            # 3. Update Cell (merge keeps the source hash)
+            now = datetime.datetime.now()
             cell_ref.set({
                 "row_idx": row_idx,
                 "col_key": col_key,
-                "value": new_value
-            })
+                "value": new_value,
+                "updated_at": now
+            }, merge=True)
+            search_index.update(dataset_id, row_idx, col_key, new_value, now)
+            self.bump_version(dataset_id)
             
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="update_cell")
             print(f"Error updating cell: {e}")
 
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="write_cells")
+    def write_cells(self, dataset_id, values):
+        """
+        Batch writes cell values [(row_idx, col_key, value)] without history.
+        Idempotent: used by distributed workers, which may write a shard twice.
+        """
+        if not self.db or not values: return
+        
+        try:
+            cells_ref = self.db.collection("datasets").document(dataset_id).collection("cells")
+            batch = self.db.batch()
+            count = 0
+            now = datetime.datetime.now()
+            for row_idx, col_key, value in values:
+                batch.set(cells_ref.document(f"{row_idx}_{col_key}"), {
+                    "row_idx": row_idx,
+                    "col_key": col_key,
+                    "value": value,
+                    "updated_at": now
+                }, merge=True)
+                search_index.update(dataset_id, row_idx, col_key, value, now)
+                count += 1
+                if count >= 400: # Safe margin
+                    metrics.FIRESTORE_BATCH_SIZE.observe(count)
+                    self._commit_versioned(batch, dataset_id)
+                    batch = self.db.batch()
+                    count = 0
+            
+            if count > 0:
+                metrics.FIRESTORE_BATCH_SIZE.observe(count)
+                self._commit_versioned(batch, dataset_id)
+        except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="write_cells")
+            print(f"Error writing cells: {e}")
+            raise
+
     # --- GLOSSARY OPERATIONS ---
-    def add_glossary_term(self, term, translation, type='pre'):
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="add_glossary_term")
+    def add_glossary_term(self, term, translation, type='pre', lang=None):
+        """
+        lang: Target language the term applies to; None applies it to every target.
+        """
         if not self.db: return None
         try:
             doc_ref = self.db.collection("glossary").add({
                 "term": term,
                 "translation": translation,
-                "type": type
+                "type": type,
+                "lang": lang
             })
             return doc_ref[1].id
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="add_glossary_term")
             print(f"Error adding glossary: {e}")
             return None
 
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="get_glossary")
     def get_glossary(self):
         if not self.db: return []
         try:
             docs = self.db.collection("glossary").stream()
             return [{"id": doc.id, **doc.to_dict()} for doc in docs]
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="get_glossary")
             print(f"Error getting glossary: {e}")
             return []
 
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="delete_glossary_term")
     def delete_glossary_term(self, term_id):
         if not self.db: return
         try:
             self.db.collection("glossary").document(term_id).delete()
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="delete_glossary_term")
             print(f"Error deleting glossary: {e}")
 
     # --- UNDO OPERATIONS ---
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="undo_last_action")
     def undo_last_action(self, dataset_id):
         if not self.db: return None
         
@@ -211,9 +648,12 @@ class FirebaseService:
             col_key = last_change['col_key']
             old_value = last_change['old_value']
             
+            now = datetime.datetime.now()
             self.db.collection("datasets").document(dataset_id)\
                    .collection("cells").document(f"{row_idx}_{col_key}")\
-                   .update({"value": old_value})
+                   .update({"value": old_value, "updated_at": now})
+            search_index.update(dataset_id, row_idx, col_key, old_value, now)
+            self.bump_version(dataset_id)
             
             # Remove history item
             self.db.collection("datasets").document(dataset_id)\
@@ -226,10 +666,12 @@ class FirebaseService:
             }
             
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="undo_last_action")
             print(f"Error undoing: {e}")
             return None
 
     # --- PROTECTED PATTERNS ---
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="get_protected_patterns")
     def get_protected_patterns(self):
         """
         Returns list of dicts: [{'id': doc_id, 'start': '...', 'end': '...'}]
@@ -239,9 +681,11 @@ class FirebaseService:
             docs = self.db.collection("settings").document("patterns").collection("items").stream()
             return [{"id": doc.id, **doc.to_dict()} for doc in docs]
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="get_protected_patterns")
             print(f"Error getting patterns: {e}")
             return []
 
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="add_protected_pattern")
     def add_protected_pattern(self, start_tag, end_tag):
         if not self.db: return None
         try:
@@ -251,14 +695,17 @@ class FirebaseService:
             })
             return doc_ref[1].id
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="add_protected_pattern")
             print(f"Error adding pattern: {e}")
             return None
 
+    @metrics.timed(metrics.FIRESTORE_SECONDS, op="delete_protected_pattern")
     def delete_protected_pattern(self, pattern_id):
         if not self.db: return
         try:
             self.db.collection("settings").document("patterns").collection("items").document(pattern_id).delete()
         except Exception as e:
+            metrics.FIRESTORE_ERRORS.inc(op="delete_protected_pattern")
             print(f"Error deleting pattern: {e}")
 
 # Singleton
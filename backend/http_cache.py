@@ -0,0 +1,76 @@
+import gzip
+
+from fastapi.responses import Response
+
+# Optional brotli support
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies are sent as is: compressing them saves nothing
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def dataset_etag(dataset_id, version, *variant):
+    """
+    Weak ETag of a dataset response: changes whenever the dataset version
+    does. variant holds whatever else shapes the body (page, format, ...).
+    """
+    tag = "-".join(str(part) for part in (dataset_id, version, *variant))
+    return f'W/"{tag}"'
+
+def not_modified(request, etag):
+    """
+    True if the request's If-None-Match already holds etag.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+def choose_encoding(request):
+    accepted = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    if brotli and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def cached_response(request, body, media_type, etag=None, headers=None):
+    """
+    Builds a response for body (bytes), compressed with brotli or gzip when
+    the client accepts it, and carrying etag. Answers 304 instead when the
+    client already holds etag.
+    """
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if etag:
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "no-cache" # Always revalidate, never serve stale
+        if not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(request) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,116 @@
+import re
+
+# Placeholder left in the skeleton where a selected leaf was taken out
+CELL_KEY = "__dataset_translator_cell__"
+
+def parse_selectors(text):
+    """
+    Splits a comma or newline separated list of selectors.
+    """
+    if not text:
+        return []
+    return [s.strip() for s in re.split(r'[,\n]', text) if s.strip()]
+
+def compile_selector(selector):
+    """
+    Compiles a path selector into a regex over dotted paths (the same
+    "messages.0.content" form used for flattened keys).
+    Glob form: '*' matches one path segment, '**' zero or more segments.
+    A JSONPath subset is accepted too: '$.a[*].b', '$..content', '$.a[0]'.
+    """
+    s = selector.strip()
+    if s.startswith('$'):
+        s = s[1:]
+        s = s.replace('..', '.**.')
+        s = re.sub(r'\[\s*\*\s*\]', '.*', s)
+        s = re.sub(r'\[\s*(\d+)\s*\]', r'.\1', s)
+        s = re.sub(r"\[\s*['\"]([^'\"]+)['\"]\s*\]", r'.\1', s)
+        s = s.strip('.')
+
+    # '**' may also match zero segments, so it absorbs the dot after it
+    segments = s.split('.')
+    pattern = ''
+    need_sep = False
+    for i, segment in enumerate(segments):
+        if segment == '**':
+            if i == len(segments) - 1:
+                pattern += r'(?:\..+)?' if need_sep else r'.*'
+            else:
+                pattern += (r'\.' if need_sep else '') + r'(?:.+\.)?'
+                need_sep = False
+            continue
+        if need_sep:
+            pattern += r'\.'
+        pattern += re.escape(segment).replace(r'\*', r'[^.]*')
+        need_sep = True
+    return re.compile(pattern)
+
+def compile_selectors(selectors):
+    return [compile_selector(s) for s in selectors]
+
+def iter_leaves(data):
+    """
+    Yields (path, value) for every leaf, depth first, without building the
+    flattened dict. Paths use the same dotted form as the upload flattener.
+    """
+    stack = [(data, '')]
+    while stack:
+        node, name = stack.pop()
+        if type(node) is dict:
+            stack.extend((node[k], f"{name}{k}.") for k in reversed(list(node)))
+        elif type(node) is list:
+            stack.extend((node[i], f"{name}{i}.") for i in reversed(range(len(node))))
+        else:
+            yield name[:-1], node
+
+def flatten_selected(data, selectors):
+    """
+    Walks the document once, iteratively, and splits it into the
+    translatable cells and an opaque skeleton.
+    Returns (cells, skeleton): cells is [(path, value)] for string leaves
+    matching any selector, in document order; skeleton is a copy of the
+    document where each of those leaves is replaced by {CELL_KEY: index}.
+    """
+    compiled = compile_selectors(selectors)
+    cells = []
+    root = [None]
+    # (node, path prefix, container of its copy, key in that container)
+    stack = [(data, '', root, 0)]
+    while stack:
+        node, name, parent, key = stack.pop()
+        if type(node) is dict:
+            copy = parent[key] = dict.fromkeys(node)
+            stack.extend((node[k], f"{name}{k}.", copy, k) for k in reversed(list(node)))
+        elif type(node) is list:
+            copy = parent[key] = [None] * len(node)
+            stack.extend((node[i], f"{name}{i}.", copy, i) for i in reversed(range(len(node))))
+        else:
+            path = name[:-1]
+            if isinstance(node, str) and any(p.fullmatch(path) for p in compiled):
+                cells.append((path, node))
+                node = {CELL_KEY: len(cells) - 1}
+            parent[key] = node
+    return cells, root[0]
+
+def renest(skeleton, values):
+    """
+    Rebuilds the document from a skeleton, putting values[i] where the
+    skeleton holds {CELL_KEY: i}.
+    """
+    root = [None]
+    stack = [(skeleton, root, 0)]
+    while stack:
+        node, parent, key = stack.pop()
+        if type(node) is dict:
+            if len(node) == 1 and CELL_KEY in node:
+                index = node[CELL_KEY]
+                parent[key] = values[index] if index < len(values) else None
+                continue
+            copy = parent[key] = dict.fromkeys(node)
+            stack.extend((v, copy, k) for k, v in node.items())
+        elif type(node) is list:
+            copy = parent[key] = [None] * len(node)
+            stack.extend((v, copy, i) for i, v in enumerate(node))
+        else:
+            parent[key] = node
+    return root[0]
@@ -1,13 +1,20 @@
 from translation_service import translation_service
 from firebase_service import firebase_service
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, StreamingResponse
+import metrics
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import pandas as pd
 import io
 import uuid
 import json
+from json_paths import parse_selectors, flatten_selected, iter_leaves, renest
+from search_index import search_index
+from shard_store import get_shard_store
+from http_cache import dataset_etag, not_modified, cached_response
+from text_preprocessor import TextPreprocessor
+import datetime
 
 app = FastAPI()
 
@@ -35,22 +42,60 @@ class TranslationRequest(BaseModel):
     dataset_id: str
     rows: list[int]
     columns: list[str]
+    # None translates to Vietnamese in place; a list writes one column per language
+    target_languages: list[str] | None = None
+    # Split into shards for worker processes (worker.py) instead of running here
+    distributed: bool = False
 
 class GlossaryItem(BaseModel):
     term: str
     translation: str
     type: str = 'pre'
+    lang: str | None = None # None: applies to every target language
+
+class PriorityHint(BaseModel):
+    # Visible row range of the grid, inclusive
+    start_row: int
+    end_row: int
+
+class SearchRequest(BaseModel):
+    dataset_id: str
+    query: str | None = None # Full-text, on source and translated values
+    columns: list[str] | None = None # Source columns; None searches all of them
+    target_languages: list[str] | None = None # Output languages; None: all translated ones
+    # untranslated, identical, protected, changed_since
+    filters: list[str] = []
+    changed_since: datetime.datetime | None = None
+    page: int = 1
+    limit: int = 100
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...), dataset_id: str | None = Form(None),
+                      json_paths: str | None = Form(None)):
+    """
+    Uploads a new dataset, or a new revision of an existing one when dataset_id
+    is given. A revision only rewrites cells whose content changed, keeps the
+    translations of the others and re-translates changed cells of columns
+    that were translated before.
+    json_paths: Comma separated path selectors (glob like '*.messages.*.content'
+    or JSONPath like '$[*].messages[*].content'). Only matching string leaves
+    become cells; the rest of the document is stored as a skeleton for export.
+    """
     if not file.filename.endswith(('.csv', '.xlsx', '.xls', '.json', '.txt')):
         raise HTTPException(status_code=400, detail="Invalid file format. Please upload CSV, Excel, JSON, or TXT.")
     
+    meta = None
+    if dataset_id:
+        meta = firebase_service.get_dataset_meta(dataset_id)
+        if not meta:
+            raise HTTPException(status_code=404, detail="Dataset not found")
+    
     try:
         contents = await file.read()
         file_type = 'csv'
         columns = []
         df = pd.DataFrame()
+        json_layout = None # (selectors, skeleton) for path-selective JSON
 
         if file.filename.endswith('.csv'):
             df = pd.read_csv(io.BytesIO(contents))
@@ -64,24 +109,20 @@ async def upload_file(file: UploadFile = File(...)):
             file_type = 'json'
             json_data = json.loads(contents)
             
-            # Flatten JSON
-            def flatten_json(y):
-                out = {}
-                def flatten(x, name=''):
-                    if type(x) is dict:
-                        for a in x:
-                            flatten(x[a], name + a + '.')
-                    elif type(x) is list:
-                        for i, a in enumerate(x):
-                            flatten(a, name + str(i) + '.')
-                    else:
-                        out[name[:-1]] = x
-                flatten(y)
-                return out
-
-            flat_data = flatten_json(json_data)
+            # Revisions reuse the selectors of the dataset unless new ones are given
+            selectors = parse_selectors(json_paths) or (meta or {}).get("json_paths") or []
+            if selectors:
+                # Only selected leaves become cells, the rest stays in the skeleton
+                leaves, skeleton = flatten_selected(json_data, selectors)
+                if not leaves:
+                    raise HTTPException(status_code=400, detail="No JSON string values match the given paths")
+                json_layout = (selectors, skeleton)
+            else:
+                # Flatten JSON
+                leaves = iter_leaves(json_data)
+            
             # Create DF with 'key' and 'value'
-            data_list = [{"key": k, "value": v} for k, v in flat_data.items()]
+            data_list = [{"key": k, "value": v} for k, v in leaves]
             df = pd.DataFrame(data_list)
             
         elif file.filename.endswith('.txt'):
@@ -106,12 +147,17 @@ async def upload_file(file: UploadFile = File(...)):
                 "editable": True
             })
             
+        if meta:
+            return upload_revision(background_tasks, dataset_id, meta, df, columns, file.filename, file_type, json_layout)
+            
         # Save to Firebase with file_type
         dataset_id = firebase_service.create_dataset(file.filename, columns, file_type)
         if not dataset_id:
             raise HTTPException(status_code=500, detail="Failed to create dataset in Firebase")
             
         firebase_service.save_cells(dataset_id, df)
+        if json_layout:
+            firebase_service.save_skeleton(dataset_id, *json_layout)
             
         return JSONResponse({
             "dataset_id": dataset_id,
@@ -120,16 +166,96 @@ async def upload_file(file: UploadFile = File(...)):
             "message": "File uploaded successfully"
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+def upload_revision(background_tasks, dataset_id, meta, df, columns, filename, file_type, json_layout=None):
+    result = firebase_service.save_revision(dataset_id, df, columns, filename)
+    if result is None:
+        raise HTTPException(status_code=500, detail="Failed to save revision in Firebase")
+    changed, unchanged, removed = result
+    if json_layout:
+        firebase_service.save_skeleton(dataset_id, *json_layout)
+    
+    # Queue re-translation of changed cells in previously translated columns,
+    # in place and/or to the languages each column was translated to
+    translated = firebase_service.translated_columns(meta)
+    retranslate = [(row, col) for row, col in changed if col in translated]
+    in_place_cells, outputs = [], []
+    for row, col in retranslate:
+        entry = translated[col]
+        if entry.get("in_place"):
+            in_place_cells.append((row, col))
+        outputs.extend((row, col, lang) for lang in entry.get("target_languages") or [])
+    
+    # Columns translated to different languages share one run over their
+    # exact outputs. An in-place run gets its own task id, so neither run
+    # resets the other's counters and failed ledger
+    task_ids = []
+    if outputs:
+        languages = sorted({lang for _, _, lang in outputs})
+        task_ids.append(dataset_id)
+        background_tasks.add_task(
+            translation_service.run_translation_task,
+            dataset_id,
+            df, # The revision holds the new source values
+            [],
+            [],
+            dataset_id,
+            languages,
+            None,
+            outputs
+        )
+    if in_place_cells:
+        task_id = f"{dataset_id}-in-place" if outputs else dataset_id
+        task_ids.append(task_id)
+        background_tasks.add_task(
+            translation_service.run_translation_task,
+            task_id,
+            df,
+            [],
+            [],
+            dataset_id,
+            None,
+            in_place_cells
+        )
+    
+    return JSONResponse({
+        "dataset_id": dataset_id,
+        "columns": columns,
+        "file_type": file_type,
+        "changed_cells": len(changed),
+        "unchanged_cells": unchanged,
+        "removed_cells": removed,
+        "retranslate_cells": len(retranslate),
+        "task_id": task_ids[0] if task_ids else None,
+        "task_ids": task_ids,
+        "message": "Revision uploaded successfully"
+    })
+
 @app.get("/dataset/{dataset_id}")
-async def get_dataset(dataset_id: str, page: int = 1, limit: int = 100):
+async def get_dataset(request: Request, dataset_id: str, page: int = 1, limit: int = 100,
+                      fmt: str = Query("records", alias="format")):
+    """
+    Returns one page of rows. format=rows sends a compact encoding: the
+    column list once, then each row as an array of values.
+    Responses carry an ETag tied to the dataset version, so polling clients
+    get a 304 (without the cells being loaded) while nothing changed.
+    """
+    if fmt not in ("records", "rows"):
+        raise HTTPException(status_code=400, detail="format must be 'records' or 'rows'")
+    
     # Fetch metadata
     meta = firebase_service.get_dataset_meta(dataset_id)
     if not meta:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
+    etag = dataset_etag(dataset_id, firebase_service.version_tag(dataset_id), page, limit, fmt)
+    if not_modified(request, etag):
+        return cached_response(request, b"", "application/json", etag)
+    
     # Fetch cells
     cells = firebase_service.get_cells(dataset_id)
     
@@ -137,9 +263,6 @@ async def get_dataset(dataset_id: str, page: int = 1, limit: int = 100):
     # This is a bit inefficient for large data but works for now
     # Ideally we'd query Firestore with pagination
     
-    if not cells:
-        return JSONResponse({"data": [], "total_rows": 0})
-
     # Group by row_idx
     rows_map = {}
     for cell in cells:
@@ -160,34 +283,35 @@ async def get_dataset(dataset_id: str, page: int = 1, limit: int = 100):
     end = start + limit
     paginated_data = data[start:end]
     
-    return JSONResponse({
+    payload = {
         "data": paginated_data,
         "total_rows": total_rows,
         "page": page,
         "limit": limit
-    })
+    }
+    if fmt == "rows":
+        # Meta column order first, then any other keys found in the page
+        columns = [col["key"] for col in meta.get("columns", [])]
+        known = set(columns)
+        for row in paginated_data:
+            for key in row:
+                if key not in known:
+                    known.add(key)
+                    columns.append(key)
+        del payload["data"]
+        payload["columns"] = columns
+        payload["rows"] = [[row.get(col) for col in columns] for row in paginated_data]
+    
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return cached_response(request, body, "application/json", etag)
 
 from progress_tracker import progress_tracker
 
-@app.post("/translate")
-async def translate_dataset(request: TranslationRequest, background_tasks: BackgroundTasks):
-    # Verify dataset exists
-    meta = firebase_service.get_dataset_meta(request.dataset_id)
-    if not meta:
-        raise HTTPException(status_code=404, detail="Dataset not found")
-    
-    # Reconstruct DF for the service (it expects a DF to read from)
-    # But wait, the service now needs to write to Firebase, not update a DF ref.
-    # We need to adapt run_translation_task.
-    
-    # For now, let's fetch the data needed for translation
-    cells = firebase_service.get_cells(request.dataset_id)
-    # ... reconstruction logic ...
-    # Actually, let's pass the dataset_id to the service and let it fetch/update directly.
-    # But the service signature is (task_id, df, rows, columns).
-    # We should update the service signature.
-    
-    # Temporary: Reconstruct full DF to pass to service, but service will update Firebase.
+def load_dataframe(dataset_id):
+    """
+    Rebuilds the dataset grid from its cells, one DataFrame row per row_idx.
+    """
+    cells = firebase_service.get_cells(dataset_id)
     rows_map = {}
     for cell in cells:
         r = cell['row_idx']
@@ -200,17 +324,52 @@ async def translate_dataset(request: TranslationRequest, background_tasks: Backg
     for r in sorted_rows:
         data.append(rows_map[r])
     
-    df = pd.DataFrame(data)
+    return pd.DataFrame(data)
+
+@app.post("/translate/plan")
+def plan_translation(request: TranslationRequest):
+    """
+    Dry run of /translate: reports segment, character and request counts,
+    cache hits and an ETA without calling the translation backend.
+    """
+    meta = firebase_service.get_dataset_meta(request.dataset_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    
+    df = load_dataframe(request.dataset_id)
+    plan = translation_service.plan_translation(df, request.rows, request.columns, request.target_languages or ['vi'])
+    plan["dataset_id"] = request.dataset_id
+    return JSONResponse(plan)
+
+@app.post("/translate")
+async def translate_dataset(request: TranslationRequest, background_tasks: BackgroundTasks):
+    # Verify dataset exists
+    meta = firebase_service.get_dataset_meta(request.dataset_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Dataset not found")
     
     task_id = request.dataset_id
     
+    if request.distributed and not get_shard_store():
+        raise HTTPException(status_code=503, detail="No shard store configured")
+    
+    # Reconstruct full DF to pass to service, but service will update Firebase.
+    df = load_dataframe(request.dataset_id)
+    
+    # One loop per task id: a second one would run the same items again
+    busy = (translation_service.is_active(task_id) if request.distributed
+            else not translation_service.reserve_task(task_id))
+    if busy:
+        raise HTTPException(status_code=409, detail="A translation of this dataset is already running")
+    
     background_tasks.add_task(
-        translation_service.run_translation_task, 
+        translation_service.create_distributed_job if request.distributed else translation_service.run_translation_task,
         task_id, 
         df, # Passed for reading values
         request.rows, 
         request.columns,
-        request.dataset_id # Pass ID for writing back
+        request.dataset_id, # Pass ID for writing back
+        request.target_languages
     )
     
     return JSONResponse({
@@ -218,29 +377,219 @@ async def translate_dataset(request: TranslationRequest, background_tasks: Backg
         "task_id": task_id
     })
 
+@app.post("/search")
+def search_dataset(request: SearchRequest):
+    """
+    Searches a dataset through its in-memory index. Returns matching row ids
+    (usable as /translate rows) and, per row, the matching cells with a snippet.
+    """
+    meta = firebase_service.get_dataset_meta(request.dataset_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    unknown = [f for f in request.filters if f not in search_index.FILTERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown filters: {', '.join(unknown)}")
+    if "changed_since" in request.filters and request.changed_since is None:
+        raise HTTPException(status_code=400, detail="changed_since filter needs a changed_since time")
+    
+    # Pair each source column with its translation output(s)
+    output_keys = {col["key"] for col in meta.get("columns", []) if col.get("output")}
+    source_columns = [col["key"] for col in meta.get("columns", []) if not col.get("output")]
+    if request.columns:
+        source_columns = [col for col in source_columns if col in request.columns]
+    # Only columns recorded as translated have a pair: others (ids, ...) would
+    # otherwise look like untranslated in-place cells
+    translated = firebase_service.translated_columns(meta)
+    pairs = []
+    for col in source_columns:
+        entry = translated.get(col)
+        if not entry:
+            continue
+        languages = request.target_languages or entry.get("target_languages")
+        outputs = [translation_service.output_column(col, lang) for lang in languages or []]
+        pairs.extend((col, key) for key in outputs if key in output_keys)
+        if entry.get("in_place") and not request.target_languages:
+            pairs.append((col, None))
+    
+    protected = None
+    if "protected" in request.filters:
+        protected = TextPreprocessor.compile_patterns(firebase_service.get_protected_patterns())
+    
+    # Writes by shard workers only show up as version bumps: a stale index
+    # re-reads the cells written since it was last synced
+    index = search_index.ensure(request.dataset_id, lambda: firebase_service.get_cells(request.dataset_id),
+                                firebase_service.get_version(request.dataset_id),
+                                lambda since: firebase_service.get_changed_cells(request.dataset_id, since))
+    results = search_index.search(
+        index, pairs, request.query, request.filters,
+        request.changed_since.timestamp() if request.changed_since else None,
+        protected, firebase_service.content_hash
+    )
+    
+    rows = sorted(results)
+    limit = max(1, min(request.limit, 1000))
+    start = (max(request.page, 1) - 1) * limit
+    page_rows = rows[start:start + limit]
+    return JSONResponse({
+        "rows": page_rows,
+        "results": [{
+            "row_idx": row,
+            "matches": [{"col_key": col, "snippet": snippet} for col, snippet in results[row]]
+        } for row in page_rows],
+        "total_rows": len(rows),
+        "page": request.page,
+        "limit": limit
+    })
+
+@app.post("/translate/retry-failed/{task_id}")
+async def retry_failed(task_id: str, background_tasks: BackgroundTasks):
+    """
+    Re-dispatches only the cells in the task's failed ledger, e.g. once the
+    backend has recovered from an outage. Runs as the same task id, so the
+    ledger afterwards lists what still failed.
+    """
+    task = progress_tracker.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task["status"] == "distributed":
+        store = get_shard_store()
+        job = store.get_progress(task_id) if store else None
+        if not job or job["status"] != "completed":
+            raise HTTPException(status_code=409, detail="Distributed task has not finished")
+        failures = store.get_failures(task_id)
+    else:
+        # Only once the task's loop has exited: a stop request is honoured
+        # between chunks, so a "stopped" task may still be writing
+        finished = task["status"] in ("completed", "failed") or (task["status"] == "stopped" and task.get("finished"))
+        if not finished:
+            raise HTTPException(status_code=409, detail=f"Task is {task['status']}")
+        failures = progress_tracker.get_failures(task_id)
+    if not failures:
+        return JSONResponse({"message": "No failed items", "task_id": task_id})
+    
+    dataset_id = task.get("dataset_id", task_id)
+    if not firebase_service.get_dataset_meta(dataset_id):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    df = load_dataframe(dataset_id)
+    if not translation_service.reserve_task(task_id):
+        raise HTTPException(status_code=409, detail="A translation of this dataset is already running")
+    
+    # Exactly the failed outputs: other targets of the same cells succeeded
+    outputs = list(dict.fromkeys((item["row"], item["col"], item["target"]) for item in failures))
+    in_place = all(item["output_col"] == item["col"] for item in failures)
+    target_languages = None if in_place else sorted({item["target"] for item in failures})
+    
+    background_tasks.add_task(
+        translation_service.run_translation_task,
+        task_id,
+        df,
+        [],
+        [],
+        dataset_id,
+        target_languages,
+        None,
+        outputs
+    )
+    
+    return JSONResponse({
+        "message": "Retrying failed items",
+        "task_id": task_id,
+        "failed_items": len(failures)
+    })
+
+@app.get("/translate/failed/{task_id}")
+async def get_failed(task_id: str, page: int = 1, limit: int = 100):
+    """
+    Pages through the task's failed ledger: the cells left untranslated,
+    with their last error. /progress only reports their count.
+    """
+    task = progress_tracker.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    limit = max(1, min(limit, 1000))
+    offset = (max(page, 1) - 1) * limit
+    if task["status"] == "distributed":
+        store = get_shard_store()
+        job = store.get_progress(task_id) if store else None
+        total = job["failed_items"] if job else 0
+        items = store.get_failures(task_id, offset, limit) if job else []
+    else:
+        total = task.get("failed_items", 0)
+        items = progress_tracker.get_failures(task_id, offset, limit)
+    return JSONResponse({
+        "task_id": task_id,
+        "items": items,
+        "total_items": total,
+        "page": page,
+        "limit": limit
+    })
+
+@app.post("/translate/priority/{task_id}")
+async def set_translation_priority(task_id: str, hint: PriorityHint):
+    """
+    Moves the given rows to the front of a running translation, e.g. the
+    rows the reviewer is looking at. The task continues in its own order
+    once they are done.
+    """
+    task = progress_tracker.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not translation_service.set_priority(task_id, hint.start_row, hint.end_row):
+        raise HTTPException(status_code=409, detail=f"Task is {task['status']}, not running or paused")
+    return JSONResponse({"message": "Priority updated", "task_id": task_id})
+
 @app.get("/progress/{task_id}")
 async def get_progress(task_id: str):
     task = progress_tracker.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return JSONResponse(task)
+    if task["status"] == "distributed":
+        # Counters live with the shards; shards and workers report the fleet
+        store = get_shard_store()
+        job = store.get_progress(task_id) if store else None
+        if job:
+            task.update(job)
+    return JSONResponse({**task, **progress_tracker.get_throughput(task_id, task)})
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+def check_pausable(task_id):
+    # Distributed tasks run in the workers, which neither pause nor resume;
+    # overwriting "distributed" would also cut /progress off the shard store
+    task = progress_tracker.get_task(task_id)
+    if task and task["status"] == "distributed":
+        raise HTTPException(status_code=409, detail="Distributed tasks cannot be paused or resumed")
 
 @app.post("/pause/{task_id}")
 async def pause_task(task_id: str):
+    check_pausable(task_id)
     progress_tracker.update_status(task_id, "paused")
     return JSONResponse({"message": "Task paused"})
 
 @app.post("/resume/{task_id}")
 async def resume_task(task_id: str):
+    check_pausable(task_id)
     progress_tracker.update_status(task_id, "running")
     return JSONResponse({"message": "Task resumed"})
 
 @app.get("/export/{dataset_id}")
-async def export_dataset(dataset_id: str):
+async def export_dataset(request: Request, dataset_id: str, lang: str | None = None):
+    """
+    Exports the dataset as CSV. Path-selective JSON datasets are re-nested
+    into their original document instead; lang picks the per-language output
+    column to put back ('value' itself when omitted).
+    Compressed when the client accepts it; ETag as for /dataset.
+    """
     meta = firebase_service.get_dataset_meta(dataset_id)
     if not meta:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
+    etag = dataset_etag(dataset_id, firebase_service.version_tag(dataset_id), "export", lang or "")
+    if not_modified(request, etag):
+        return cached_response(request, b"", "application/octet-stream", etag)
+    
     cells = firebase_service.get_cells(dataset_id)
     
     rows_map = {}
@@ -255,20 +604,48 @@ async def export_dataset(dataset_id: str):
     for r in sorted_rows:
         data.append(rows_map[r])
         
-    df = pd.DataFrame(data)
-    
     original_filename = meta.get("filename", "export.csv")
     base_name = original_filename.rsplit('.', 1)[0]
     
-    csv_content = df.to_csv(index=False)
+    if meta.get("json_paths"):
+        skeleton = firebase_service.get_skeleton(dataset_id)
+        if skeleton is None:
+            raise HTTPException(status_code=500, detail="JSON skeleton not found")
+        value_col = translation_service.output_column("value", lang) if lang else "value"
+        values = [row.get(value_col, row.get("value")) for row in data]
+        json_content = json.dumps(renest(skeleton, values), ensure_ascii=False, indent=2)
+        
+        return cached_response(request, json_content.encode('utf-8'), "application/json", etag, {
+            "Content-Disposition": f"attachment; filename={base_name}_translated.json"
+        })
+    
+    df = pd.DataFrame(data)
     
-    response = StreamingResponse(iter([csv_content.encode('utf-8-sig')]), media_type="text/csv")
-    response.headers["Content-Disposition"] = f"attachment; filename={base_name}_translated.csv"
+    csv_content = df.to_csv(index=False)
     
-    return response
+    return cached_response(request, csv_content.encode('utf-8-sig'), "text/csv", etag, {
+        "Content-Disposition": f"attachment; filename={base_name}_translated.csv"
+    })
 
 # --- GLOSSARY ENDPOINTS ---
 @app.get("/glossary")
+async def get_glossary():
+    return firebase_service.get_glossary()
+
+@app.post("/glossary")
+async def add_glossary_term(item: GlossaryItem):
+    if item.type not in ("pre", "post"):
+        raise HTTPException(status_code=400, detail="type must be 'pre' or 'post'")
+    term_id = firebase_service.add_glossary_term(item.term, item.translation, item.type, item.lang or None)
+    if not term_id:
+        raise HTTPException(status_code=500, detail="Failed to save glossary term")
+    return {"id": term_id, "term": item.term, "translation": item.translation, "type": item.type, "lang": item.lang or None}
+
+@app.delete("/glossary/{term_id}")
+async def delete_glossary_term(term_id: str):
+    firebase_service.delete_glossary_term(term_id)
+    return JSONResponse({"message": "Term deleted"})
+
 # --- UNDO ENDPOINT ---
 @app.post("/undo/{dataset_id}")
 async def undo_action(dataset_id: str):
@@ -0,0 +1,213 @@
+import time
+import functools
+from threading import Lock
+
+# Default histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels):
+        with self.lock:
+            self.values.pop(self._key(labels), None)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def time(self, **labels):
+        """
+        Context manager observing the wall time of its block.
+        """
+        return _Timer(self, time.perf_counter, labels)
+
+    def cpu_time(self, **labels):
+        """
+        Context manager observing the CPU time the current thread spends in its block.
+        """
+        return _Timer(self, time.thread_time, labels)
+
+    def _render_sample(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            le = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, clock, labels):
+        self.histogram = histogram
+        self.clock = clock
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = self.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(self.clock() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram, **labels):
+    """
+    Decorator observing the wall time of every call.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Global registry
+registry = MetricsRegistry()
+
+# --- Translation backend ---
+BACKEND_CALL_SECONDS = registry.histogram(
+    "translator_backend_call_seconds", "Latency of single translation backend calls.", ["target", "outcome"])
+SEGMENT_RETRIES = registry.histogram(
+    "translator_segment_retries", "Retries needed per translated segment.", ["outcome"], buckets=(0, 1, 2, 3, 4, 5))
+SEGMENT_CHARS = registry.histogram(
+    "translator_segment_chars", "Length of segments sent to the backend.", [],
+    buckets=(10, 50, 100, 250, 500, 1000, 2000, 3000, 4500))
+CACHE_LOOKUPS = registry.counter(
+    "translator_cache_lookups_total", "Segment cache lookups.", ["result"])
+PREPROCESS_CPU_SECONDS = registry.histogram(
+    "translator_preprocess_cpu_seconds", "CPU time spent preparing and finishing cells.", ["stage"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+QUEUE_DEPTH = registry.gauge(
+    "translator_queue_depth", "Segments submitted to the worker pool and not finished yet.")
+CELLS_TRANSLATED = registry.counter(
+    "translator_cells_total", "Cells written by translation tasks.")
+CHARS_TRANSLATED = registry.counter(
+    "translator_chars_total", "Source characters of cells written by translation tasks.")
+CELLS_FAILED = registry.counter(
+    "translator_cells_failed_total", "Cells left unwritten because a segment failed every retry.", ["error"])
+
+# --- Firestore ---
+FIRESTORE_SECONDS = registry.histogram(
+    "firestore_op_seconds", "Latency of Firestore operations.", ["op"])
+FIRESTORE_BATCH_SIZE = registry.histogram(
+    "firestore_batch_size", "Writes per committed Firestore batch.", [],
+    buckets=(1, 10, 50, 100, 200, 300, 400, 500))
+FIRESTORE_ERRORS = registry.counter(
+    "firestore_errors_total", "Failed Firestore operations.", ["op"])
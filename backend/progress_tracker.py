@@ -1,15 +1,31 @@
+import atexit
 import json
 import os
 import time
-from threading import Lock
+from threading import Event, Lock, Thread
 
 class ProgressTracker:
-    def __init__(self, storage_file="progress.json"):
+    # How often pending progress is written to disk (seconds)
+    FLUSH_INTERVAL = 0.5
+
+    def __init__(self, storage_file="progress.json", failures_file=None):
         self.storage_file = storage_file
+        # The failed ledgers can grow large: kept apart from the progress
+        # counters, which are rewritten several times a second
+        self.failures_file = failures_file or os.path.splitext(storage_file)[0] + ".failed.json"
         self.lock = Lock()
+        self.save_lock = Lock()
         self.tasks = {}
+        self.failures = {} # task_id -> {"row|output_col": entry}, see record_failure
+        self.failures_dirty = False
+        self.dirty = Event()
         self.load_progress()
 
+        # Progress counters live in memory; this thread persists them
+        self.flusher = Thread(target=self._flush_loop, name="progress-flusher", daemon=True)
+        self.flusher.start()
+        atexit.register(self.flush)
+
     def load_progress(self):
         if os.path.exists(self.storage_file):
             try:
@@ -18,45 +34,224 @@ class ProgressTracker:
             except Exception as e:
                 print(f"Error loading progress: {e}")
                 self.tasks = {}
+        if os.path.exists(self.failures_file):
+            try:
+                with open(self.failures_file, 'r', encoding='utf-8') as f:
+                    self.failures = json.load(f)
+            except Exception as e:
+                print(f"Error loading failed ledgers: {e}")
+                self.failures = {}
+        # Ledgers written by older versions inside the progress file
+        for task_id, task in self.tasks.items():
+            if "failed" in task:
+                self.failures.setdefault(task_id, task.pop("failed"))
+                self.failures_dirty = True
+
+    def _write(self, path, data):
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_file, path)
 
     def save_progress(self):
-        with self.lock:
+        # Snapshot under the lock, write outside it so counters never wait on disk.
+        # save_lock keeps concurrent saves from writing snapshots out of order.
+        with self.save_lock:
+            with self.lock:
+                self.dirty.clear()
+                data = json.dumps(self.tasks, indent=2)
+                failures = json.dumps(self.failures) if self.failures_dirty else None
+                self.failures_dirty = False
             try:
-                with open(self.storage_file, 'w', encoding='utf-8') as f:
-                    json.dump(self.tasks, f, indent=2)
+                if failures is not None:
+                    self._write(self.failures_file, failures)
+                self._write(self.storage_file, data)
             except Exception as e:
                 print(f"Error saving progress: {e}")
 
-    def init_task(self, task_id, total_items):
+    def flush(self):
+        """
+        Persists pending progress now, if there is any.
+        """
+        if self.dirty.is_set():
+            self.save_progress()
+
+    def _flush_loop(self):
+        while True:
+            self.dirty.wait()
+            time.sleep(self.FLUSH_INTERVAL)
+            self.flush()
+
+    def _touch(self, task):
+        task["last_updated"] = time.time()
+        self.dirty.set()
+
+    def init_task(self, task_id, total_items, fingerprint=None, dataset_id=None):
+        """
+        Starts a task on dataset_id (by default the task id). If an earlier run of the same work (same fingerprint)
+        did not complete, e.g. it was cut off by a restart, the task keeps its
+        resume point and failed ledger; the caller recounts what lies before
+        the resume point with rebase_task.
+        Returns the index of the first work item to dispatch.
+        """
         with self.lock:
+            previous = self.tasks.get(task_id)
+            resume = (fingerprint is not None and previous is not None
+                      and previous.get("fingerprint") == fingerprint
+                      and previous.get("status") != "completed")
             self.tasks[task_id] = {
                 "total_items": total_items,
                 "processed_items": 0,
-                "status": "running", # running, paused, completed, error
+                "status": "running", # running, paused, stopped, completed, failed, distributed
                 "start_time": time.time(),
                 "last_updated": time.time(),
-                "current_index": 0 
+                "current_index": previous.get("current_index", 0) if resume else 0,
+                "processed_chars": 0,
+                "failed_items": previous.get("failed_items", 0) if resume else 0,
+                "finished": False, # Set once the task's loop has exited
+                "fingerprint": fingerprint,
+                "dataset_id": dataset_id or task_id
             }
+            if not resume and self.failures.pop(task_id, None) is not None:
+                self.failures_dirty = True
+            start_index = self.tasks[task_id]["current_index"]
         self.save_progress()
+        return start_index
+
+    def rebase_task(self, task_id, processed_items, processed_chars, keep_failure):
+        """
+        Sets the counters of a resumed task to what was done before its resume
+        point. Items after it are dispatched (and counted) again, so their
+        earlier counts and failures are dropped.
+        keep_failure(entry): True for ledger entries before the resume point.
+        """
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if not task:
+                return
+            failed = {key: entry for key, entry in self.failures.get(task_id, {}).items() if keep_failure(entry)}
+            self.failures[task_id] = failed
+            self.failures_dirty = True
+            task["processed_items"] = processed_items
+            task["processed_chars"] = processed_chars
+            task["failed_items"] = len(failed)
+            self._touch(task)
+
+    def increment(self, task_id, items=1, chars=0):
+        """
+        Counts finished items. Memory only: persisted by the background flusher.
+        """
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task:
+                task["processed_items"] += items
+                task["processed_chars"] = task.get("processed_chars", 0) + chars
+                self._touch(task)
 
-    def update_progress(self, task_id, processed_count, current_index=None):
+    def update_progress(self, task_id, processed_count, current_index=None, processed_chars=None):
         with self.lock:
             if task_id in self.tasks:
                 self.tasks[task_id]["processed_items"] = processed_count
                 if current_index is not None:
                     self.tasks[task_id]["current_index"] = current_index
-                self.tasks[task_id]["last_updated"] = time.time()
-        self.save_progress()
+                if processed_chars is not None:
+                    self.tasks[task_id]["processed_chars"] = processed_chars
+                self._touch(self.tasks[task_id])
+
+    def set_skipped(self, task_id, skipped, skipped_columns=None):
+        """
+        Records outputs passed through without translation, by reason.
+        """
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]["skipped_items"] = sum(skipped.values())
+                self.tasks[task_id]["skipped"] = skipped
+                self.tasks[task_id]["skipped_columns"] = skipped_columns or []
+                self._touch(self.tasks[task_id])
+
+    def record_failure(self, task_id, row, col, output_col, target, error, attempts, segments=1):
+        """
+        Adds a cell left untranslated to the task's failed ledger. The task
+        itself only holds the failed_items count.
+        col: Source column; output_col: column the translation goes to.
+        error: Class name of the last backend error; attempts: calls made
+        for the failing segment; segments: failed segments in the cell.
+        """
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task:
+                failed = self.failures.setdefault(task_id, {})
+                failed[f"{row}|{output_col}"] = {
+                    "row": row,
+                    "col": col,
+                    "output_col": output_col,
+                    "target": target,
+                    "error": error,
+                    "attempts": attempts,
+                    "segments": segments
+                }
+                task["failed_items"] = len(failed)
+                self.failures_dirty = True
+                self._touch(task)
+
+    def get_failures(self, task_id, offset=0, limit=None):
+        """
+        Returns the failed ledger entries of a task, optionally a page of them.
+        """
+        with self.lock:
+            entries = list(self.failures.get(task_id, {}).values())
+        return entries[offset:offset + limit if limit is not None else None]
+
+    def set_current_index(self, task_id, current_index):
+        """
+        Records the resume point (index of the next work item to dispatch).
+        """
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]["current_index"] = current_index
+                self._touch(self.tasks[task_id])
 
     def update_status(self, task_id, status):
+        # Status changes are rare and must survive a restart: persist right away
         with self.lock:
             if task_id in self.tasks:
                 self.tasks[task_id]["status"] = status
-                self.tasks[task_id]["last_updated"] = time.time()
+                self._touch(self.tasks[task_id])
+        self.save_progress()
+
+    def finish_task(self, task_id, status):
+        """
+        Records that the task's loop has exited, with its final status
+        (completed, stopped or failed).
+        """
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]["status"] = status
+                self.tasks[task_id]["finished"] = True
+                self._touch(self.tasks[task_id])
         self.save_progress()
 
     def get_task(self, task_id):
-        return self.tasks.get(task_id)
+        with self.lock:
+            task = self.tasks.get(task_id)
+            return dict(task) if task else None
+
+    def get_throughput(self, task_id, task=None):
+        """
+        Returns cells/s and chars/s of a task since it started.
+        task: Task state to use instead of the tracked one (e.g. merged with
+        the counters of a distributed job).
+        """
+        task = task or self.get_task(task_id)
+        if not task:
+            return None
+        end = time.time() if task["status"] in ("running", "paused") else task["last_updated"]
+        elapsed = max(end - task["start_time"], 1e-9)
+        return {
+            "elapsed_seconds": elapsed,
+            "cells_per_second": task["processed_items"] / elapsed,
+            "chars_per_second": task.get("processed_chars", 0) / elapsed,
+        }
 
     def get_status(self, task_id):
         task = self.tasks.get(task_id)
@@ -0,0 +1,338 @@
+import re
+import time
+from collections import OrderedDict
+from threading import Event, Lock
+
+class DatasetIndex:
+    """
+    In-memory index of one dataset's cells: values by column, a token
+    inverted index for full-text search and per-cell change times.
+    """
+    TOKEN = re.compile(r'\w+')
+
+    def __init__(self):
+        self.columns = {}      # col -> {row: value}
+        self.source_hashes = {} # (row, col) -> hash of the uploaded value
+        self.updated = {}      # (row, col) -> unix timestamp of the last write
+        self.postings = {}     # token -> {(row, col)}
+        self.loaded = Event()
+        # Guards the maps above; searches of other datasets don't wait on it
+        self.lock = Lock()
+        # Dataset version the index reflects (None: not known yet)
+        self.version = None
+        # Unix time of the last read of the stored cells
+        self.synced_at = None
+
+    @classmethod
+    def tokens(cls, text):
+        return set(cls.TOKEN.findall(str(text).lower()))
+
+    def put(self, row, col, value, source_hash=None, updated_at=None):
+        key = (row, col)
+        values = self.columns.setdefault(col, {})
+        old = values.get(row)
+        if old is not None:
+            for token in self.tokens(old):
+                keys = self.postings.get(token)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self.postings[token]
+        value = str(value)
+        values[row] = value
+        for token in self.tokens(value):
+            self.postings.setdefault(token, set()).add(key)
+        if source_hash is not None:
+            self.source_hashes[key] = source_hash
+        if updated_at is not None:
+            self.updated[key] = updated_at
+
+    def remove(self, row, col):
+        key = (row, col)
+        old = self.columns.get(col, {}).pop(row, None)
+        if old is not None:
+            for token in self.tokens(old):
+                keys = self.postings.get(token)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self.postings[token]
+        self.source_hashes.pop(key, None)
+        self.updated.pop(key, None)
+
+    def value(self, row, col):
+        return self.columns.get(col, {}).get(row)
+
+    def match(self, query):
+        """
+        Returns the (row, col) keys whose value contains every word of the
+        query. The last word also matches as a prefix (search as you type).
+        Queries without word characters fall back to a substring scan.
+        """
+        words = self.TOKEN.findall(query.lower())
+        if not words:
+            needle = query.lower()
+            return {(row, col) for col, values in self.columns.items()
+                    for row, value in values.items() if needle in value.lower()}
+
+        *exact, last = words
+        sets = [self.postings.get(word, set()) for word in exact]
+        prefixed = set()
+        for token, keys in self.postings.items():
+            if token.startswith(last):
+                prefixed |= keys
+        sets.append(prefixed)
+
+        sets.sort(key=len)
+        hits = set(sets[0])
+        for keys in sets[1:]:
+            hits &= keys
+        return hits
+
+
+class SearchIndex:
+    """
+    Keeps a DatasetIndex per recently used dataset. An index is built at
+    upload (or lazily from the stored cells on first search) and updated by
+    FirebaseService on every cell write, so searches never reload the dataset.
+    """
+    MAX_DATASETS = 8
+    SNIPPET_CHARS = 80
+    # Changed cells are re-read from this long before the last sync, for
+    # clock skew between this process and the writers
+    REFRESH_OVERLAP_SECONDS = 30
+    FILTERS = ("untranslated", "identical", "protected", "changed_since")
+
+    def __init__(self):
+        self.indexes = OrderedDict()
+        self.lock = Lock() # Guards self.indexes; each DatasetIndex has its own lock
+
+    def _get(self, dataset_id):
+        index = self.indexes.get(dataset_id)
+        if index is not None:
+            self.indexes.move_to_end(dataset_id)
+        return index
+
+    def _create(self, dataset_id):
+        index = DatasetIndex()
+        self.indexes[dataset_id] = index
+        while len(self.indexes) > self.MAX_DATASETS:
+            self.indexes.popitem(last=False)
+        return index
+
+    def build(self, dataset_id, cells, version=None):
+        """
+        (Re)builds the index of a dataset from cell dicts
+        (row_idx, col_key, value and optional source_hash, updated_at).
+        version: Dataset version the cells are at, if known.
+        """
+        with self.lock:
+            index = self._create(dataset_id)
+            index.version = version
+            index.synced_at = time.time()
+        with index.lock:
+            for cell in cells:
+                index.put(cell['row_idx'], cell['col_key'], cell.get('value', ''),
+                          cell.get('source_hash'), self._timestamp(cell.get('updated_at')))
+        index.loaded.set()
+
+    def ensure(self, dataset_id, load_cells, version=None, load_changed=None):
+        """
+        Returns the index of a dataset, building it with load_cells() if it is
+        not in memory. Writes that arrive while loading are kept over the
+        loaded (older) values.
+        version: Current dataset version. An index behind it missed writes
+            made by other processes (e.g. shard workers): it is refreshed with
+            load_changed(since), the cells written since a unix time (None if
+            the read failed), or rebuilt without it.
+        """
+        since = None
+        with self.lock:
+            index = self._get(dataset_id)
+            if index is not None and None not in (version, index.version) and index.version < version:
+                if load_changed is not None and index.synced_at is not None:
+                    since = index.synced_at - self.REFRESH_OVERLAP_SECONDS
+                    # Searches meanwhile use the index as it is
+                    index.version = version
+                    index.synced_at = time.time()
+                else:
+                    print(f"Search index of {dataset_id} is stale (version {index.version} < {version}), rebuilding.")
+                    index = None
+            loading = index is None
+            if loading:
+                index = self._create(dataset_id)
+                index.version = version
+                index.synced_at = time.time()
+            elif index.version is None:
+                index.version = version
+        if not loading:
+            index.loaded.wait()
+            if since is not None:
+                cells = load_changed(since)
+                if cells is None:
+                    # The read failed: the next search rebuilds the index
+                    with self.lock:
+                        if self.indexes.get(dataset_id) is index:
+                            del self.indexes[dataset_id]
+                else:
+                    self._refresh(dataset_id, index, cells)
+            return index
+
+        try:
+            cells = load_cells()
+            with index.lock:
+                for cell in cells:
+                    row, col = cell['row_idx'], cell['col_key']
+                    if (row, col) in index.updated:
+                        continue
+                    index.put(row, col, cell.get('value', ''),
+                              cell.get('source_hash'), self._timestamp(cell.get('updated_at')))
+        except Exception:
+            with self.lock:
+                if self.indexes.get(dataset_id) is index:
+                    del self.indexes[dataset_id]
+            raise
+        finally:
+            index.loaded.set()
+        return index
+
+    def _refresh(self, dataset_id, index, cells):
+        """
+        Applies cells re-read from the store, unless this process wrote the
+        cell later.
+        """
+        count = 0
+        with index.lock:
+            for cell in cells:
+                row, col = cell['row_idx'], cell['col_key']
+                updated_at = self._timestamp(cell.get('updated_at'))
+                if (index.updated.get((row, col)) or 0.0) > (updated_at or 0.0):
+                    continue
+                index.put(row, col, cell.get('value', ''), cell.get('source_hash'), updated_at)
+                count += 1
+        print(f"Search index of {dataset_id} refreshed with {count} changed cells.")
+
+    def update(self, dataset_id, row, col, value, updated_at=None, source_hash=None):
+        """
+        Applies a cell write. No-op for datasets that are not in memory; their
+        index is built from the stored cells when first searched.
+        """
+        with self.lock:
+            index = self.indexes.get(dataset_id)
+        if index is not None:
+            with index.lock:
+                index.put(row, col, value, source_hash, self._timestamp(updated_at) or 0.0)
+
+    def remove(self, dataset_id, row, col):
+        with self.lock:
+            index = self.indexes.get(dataset_id)
+        if index is not None:
+            with index.lock:
+                index.remove(row, col)
+
+    def advance(self, dataset_id, count=1):
+        """
+        Follows a version bump for a write made by this process, which the
+        index has already applied.
+        """
+        with self.lock:
+            index = self.indexes.get(dataset_id)
+            if index is not None and index.version is not None:
+                index.version += count
+
+    def drop(self, dataset_id):
+        with self.lock:
+            self.indexes.pop(dataset_id, None)
+
+    @staticmethod
+    def _timestamp(value):
+        if value is None:
+            return None
+        if hasattr(value, "timestamp"):
+            return value.timestamp()
+        return float(value)
+
+    def snippet(self, value, query=None):
+        """
+        Returns a window of the value around the first query match.
+        """
+        value = str(value)
+        width = self.SNIPPET_CHARS
+        start = 0
+        if query:
+            words = DatasetIndex.TOKEN.findall(query.lower()) or [query.lower()]
+            found = value.lower().find(words[0])
+            if found > width // 2:
+                start = found - width // 4
+        text = value[start:start + width].replace('\n', ' ')
+        if start > 0:
+            text = '…' + text
+        if start + width < len(value):
+            text += '…'
+        return text
+
+    def search(self, index, pairs, query=None, filters=(), changed_since=None,
+               protected=None, hash_value=None):
+        """
+        Finds matching cells.
+        pairs: [(source_col, output_col)] to search; output_col is None when
+            translations are written in place.
+        filters: Names from FILTERS, all of which must hold for the
+            (source, output) pair of a row:
+            untranslated: the output is blank (in place: the cell still holds
+                its uploaded value).
+            identical: the output equals the source (in place: same as
+                untranslated, the two cannot be told apart).
+            protected: the source matches the protected regex.
+            changed_since: the source or output was written after changed_since.
+        hash_value: Function hashing a value like the stored source hashes.
+        Returns {row: [(col, snippet)]}.
+        """
+        with index.lock:
+            hits = index.match(query) if query else None
+            results = {}
+            for source_col, output_col in pairs:
+                sources = index.columns.get(source_col, {})
+                outputs = index.columns.get(output_col, {}) if output_col else {}
+                if hits is not None:
+                    rows = {row for row, col in hits if col in (source_col, output_col)}
+                else:
+                    rows = sources.keys()
+
+                for row in rows:
+                    source = sources.get(row, '')
+                    if filters and not source.strip():
+                        continue
+                    target_col = output_col or source_col
+                    output = outputs.get(row, '') if output_col else source
+                    keep = True
+                    for name in filters:
+                        if name == "untranslated":
+                            keep = (not output.strip() if output_col
+                                    else index.source_hashes.get((row, source_col)) == hash_value(source))
+                        elif name == "identical":
+                            keep = (output.strip() == source.strip() if output_col
+                                    else index.source_hashes.get((row, source_col)) == hash_value(source))
+                        elif name == "protected":
+                            keep = bool(protected and protected.search(source))
+                        elif name == "changed_since":
+                            keep = changed_since is not None and max(
+                                index.updated.get((row, source_col)) or 0.0,
+                                index.updated.get((row, target_col)) or 0.0) >= changed_since
+                        if not keep:
+                            break
+                    if not keep:
+                        continue
+
+                    if hits is not None:
+                        cols = [col for col in (source_col, output_col) if col and (row, col) in hits]
+                    else:
+                        cols = [target_col if output_col and output else source_col]
+                    matches = results.setdefault(row, [])
+                    for col in cols:
+                        if all(col != c for c, _ in matches):
+                            matches.append((col, self.snippet(index.value(row, col) or '', query)))
+            return results
+
+# Singleton
+search_index = SearchIndex()
@@ -0,0 +1,444 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+def abandoned_failures(items, targets, in_place, attempts):
+    """
+    Failed ledger entries for every output of a shard that was given up, so
+    the job's processed and failed counts still add up to its total.
+    """
+    from translation_service import TranslationService
+
+    failed = []
+    for row, col, _, skip in items:
+        for target in targets:
+            if target in skip:
+                continue # Passed through, not counted in the total
+            failed.append({"row": row, "col": col,
+                           "output_col": col if in_place else TranslationService.output_column(col, target),
+                           "target": target, "error": "ShardAbandoned", "attempts": attempts, "segments": 0})
+    return failed
+
+
+class SQLiteShardStore:
+    """
+    Shards of distributed translation jobs in a SQLite file. Stand-in for
+    FirestoreShardStore when running several workers on one machine: all
+    claims go through BEGIN IMMEDIATE, so concurrent processes never lease
+    the same shard. Results are kept in a local table.
+
+    Shard dicts carry task_id, shard_id, items [[row, col, text, skip]],
+    owner and attempts; owner and attempts together are the lease token
+    every later call is checked against.
+    """
+    # Shards are given up after this many leases (e.g. a crashing payload)
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    task_id TEXT PRIMARY KEY, dataset_id TEXT, targets TEXT, in_place INTEGER,
+                    total_items INTEGER, processed_items INTEGER DEFAULT 0, skipped TEXT,
+                    status TEXT, created_at REAL);
+                CREATE TABLE IF NOT EXISTS shards (
+                    task_id TEXT, shard_id INTEGER, status TEXT, owner TEXT, lease_expires REAL,
+                    attempts INTEGER DEFAULT 0, items TEXT, processed INTEGER DEFAULT 0, failed TEXT,
+                    PRIMARY KEY (task_id, shard_id));
+                CREATE TABLE IF NOT EXISTS results (
+                    task_id TEXT, row_idx INTEGER, col_key TEXT, value TEXT,
+                    PRIMARY KEY (task_id, row_idx, col_key));
+            """)
+
+    def _connect(self):
+        # One connection per thread (workers heartbeat from a second thread)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def create_job(self, task_id, dataset_id, targets, in_place, shards, total_items, skipped=None):
+        """
+        Stores a job and its shards, replacing a previous job with the same id.
+        shards: [[[row, col, text, skip], ...], ...]
+        """
+        conn = self._transaction()
+        try:
+            conn.execute("DELETE FROM shards WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM results WHERE task_id = ?", (task_id,))
+            conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                         (task_id, dataset_id, json.dumps(targets), int(in_place), total_items,
+                          json.dumps(skipped or {}), "running" if shards else "completed", time.time()))
+            conn.executemany("INSERT INTO shards (task_id, shard_id, status, items) VALUES (?, ?, 'pending', ?)",
+                             [(task_id, i, json.dumps(items)) for i, items in enumerate(shards)])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_job(self, task_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["targets"] = json.loads(job["targets"])
+        job["in_place"] = bool(job["in_place"])
+        job["skipped"] = json.loads(job["skipped"] or "{}")
+        return job
+
+    def claim(self, worker_id, lease_seconds):
+        """
+        Leases the next pending shard, or one whose lease expired (its worker
+        is presumed dead). Returns the shard, or None if there is no work.
+        """
+        now = time.time()
+        conn = self._transaction()
+        try:
+            # Expired shards that used up their attempts are given up
+            abandoned = conn.execute(
+                "SELECT s.task_id, s.shard_id, s.attempts, s.items, j.targets, j.in_place FROM shards s "
+                "JOIN jobs j ON j.task_id = s.task_id WHERE s.status = 'leased' "
+                "AND s.lease_expires < ? AND s.attempts >= ?", (now, self.MAX_ATTEMPTS)).fetchall()
+            for row in abandoned:
+                failed = abandoned_failures(json.loads(row["items"]), json.loads(row["targets"]),
+                                            bool(row["in_place"]), row["attempts"])
+                conn.execute("UPDATE shards SET status = 'failed', failed = ? WHERE task_id = ? AND shard_id = ?",
+                             (json.dumps(failed), row["task_id"], row["shard_id"]))
+                print(f"Shard {row['task_id']}/{row['shard_id']} given up after {row['attempts']} attempts.")
+            row = conn.execute(
+                "SELECT s.task_id, s.shard_id, s.attempts, s.items FROM shards s "
+                "JOIN jobs j ON j.task_id = s.task_id "
+                "WHERE s.status = 'pending' OR (s.status = 'leased' AND s.lease_expires < ?) "
+                "ORDER BY j.created_at, s.shard_id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                self._finish_jobs(conn)
+                conn.execute("COMMIT")
+                return None
+            attempts = row["attempts"] + 1
+            conn.execute("UPDATE shards SET status = 'leased', owner = ?, lease_expires = ?, attempts = ? "
+                         "WHERE task_id = ? AND shard_id = ?",
+                         (worker_id, now + lease_seconds, attempts, row["task_id"], row["shard_id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"task_id": row["task_id"], "shard_id": row["shard_id"], "owner": worker_id,
+                "attempts": attempts, "items": json.loads(row["items"])}
+
+    def heartbeat(self, shard, lease_seconds):
+        """
+        Extends the lease. Returns False if the shard was reclaimed meanwhile.
+        """
+        cursor = self._connect().execute(
+            "UPDATE shards SET lease_expires = ? WHERE task_id = ? AND shard_id = ? "
+            "AND status = 'leased' AND owner = ? AND attempts = ?",
+            (time.time() + lease_seconds, shard["task_id"], shard["shard_id"], shard["owner"], shard["attempts"]))
+        return cursor.rowcount == 1
+
+    def write_results(self, shard, values):
+        """
+        Stores finished outputs [(row, col, value)]. Keyed by cell, so writing
+        a shard again (after a reclaim) leaves the same state.
+        """
+        if not values:
+            return
+        conn = self._transaction()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                             [(shard["task_id"], row, col, value) for row, col, value in values])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def complete(self, shard, processed, failed):
+        """
+        Marks a leased shard done and adds its counts to the job. Returns
+        False (and changes nothing) if the lease was lost.
+        """
+        conn = self._transaction()
+        try:
+            cursor = conn.execute(
+                "UPDATE shards SET status = 'done', processed = ?, failed = ? WHERE task_id = ? AND shard_id = ? "
+                "AND status = 'leased' AND owner = ? AND attempts = ?",
+                (processed, json.dumps(failed), shard["task_id"], shard["shard_id"], shard["owner"], shard["attempts"]))
+            if cursor.rowcount == 1:
+                conn.execute("UPDATE jobs SET processed_items = processed_items + ? WHERE task_id = ?",
+                             (processed, shard["task_id"]))
+                self._finish_jobs(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def _finish_jobs(self, conn):
+        conn.execute("UPDATE jobs SET status = 'completed' WHERE status = 'running' AND NOT EXISTS ("
+                     "SELECT 1 FROM shards s WHERE s.task_id = jobs.task_id AND s.status IN ('pending', 'leased'))")
+
+    def has_work(self):
+        """
+        True while any shard is pending or leased.
+        """
+        row = self._connect().execute(
+            "SELECT 1 FROM shards WHERE status IN ('pending', 'leased') LIMIT 1").fetchone()
+        return row is not None
+
+    def get_progress(self, task_id):
+        job = self.get_job(task_id)
+        if job is None:
+            return None
+        now = time.time()
+        conn = self._connect()
+        counts = {row["status"]: row["n"] for row in conn.execute(
+            "SELECT status, COUNT(*) AS n FROM shards WHERE task_id = ? GROUP BY status", (task_id,))}
+        workers = [row["owner"] for row in conn.execute(
+            "SELECT DISTINCT owner FROM shards WHERE task_id = ? AND status = 'leased' AND lease_expires >= ?",
+            (task_id, now))]
+        failed_items = conn.execute(
+            "SELECT COALESCE(SUM(json_array_length(failed)), 0) AS n FROM shards "
+            "WHERE task_id = ? AND failed IS NOT NULL", (task_id,)).fetchone()["n"]
+        return {
+            "total_items": job["total_items"],
+            "processed_items": job["processed_items"],
+            "status": job["status"],
+            "failed_items": failed_items,
+            "shards": {"done": counts.get("done", 0), "total": sum(counts.values())},
+            "workers": workers,
+        }
+
+    def get_failures(self, task_id, offset=0, limit=None):
+        """
+        Returns the failed ledger entries of a job, optionally a page of them.
+        """
+        failed = []
+        for row in self._connect().execute(
+                "SELECT failed FROM shards WHERE task_id = ? AND failed IS NOT NULL ORDER BY shard_id", (task_id,)):
+            failed.extend(json.loads(row["failed"]))
+        return failed[offset:offset + limit if limit is not None else None]
+
+    def get_results(self, task_id):
+        """
+        Returns {(row, col): value} written for a job.
+        """
+        rows = self._connect().execute(
+            "SELECT row_idx, col_key, value FROM results WHERE task_id = ?", (task_id,))
+        return {(row["row_idx"], row["col_key"]): row["value"] for row in rows}
+
+
+class FirestoreShardStore:
+    """
+    Shards of distributed translation jobs in Firestore:
+    jobs/{task_id} and jobs/{task_id}/shards/{n}. Claims, heartbeats and
+    completions run in transactions checked against the lease token.
+    Results are written straight into the dataset cells.
+    """
+    MAX_ATTEMPTS = 5
+    # Candidate shards read per claim attempt
+    CLAIM_BATCH = 5
+
+    def __init__(self, db):
+        self.db = db
+
+    def _job_ref(self, task_id):
+        return self.db.collection("jobs").document(task_id)
+
+    def _shard_ref(self, shard):
+        return self._job_ref(shard["task_id"]).collection("shards").document(str(shard["shard_id"]))
+
+    def create_job(self, task_id, dataset_id, targets, in_place, shards, total_items, skipped=None):
+        job_ref = self._job_ref(task_id)
+        for old in job_ref.collection("shards").stream():
+            old.reference.delete()
+
+        batch = self.db.batch()
+        count = 0
+        for i, items in enumerate(shards):
+            # Items as JSON text: Firestore has no nested arrays
+            batch.set(job_ref.collection("shards").document(str(i)), {
+                "shard_id": i,
+                "status": "pending",
+                "attempts": 0,
+                "items": json.dumps(items, ensure_ascii=False),
+            })
+            count += 1
+            if count >= 50: # Shards are large documents
+                batch.commit()
+                batch = self.db.batch()
+                count = 0
+        if count > 0:
+            batch.commit()
+
+        job_ref.set({
+            "dataset_id": dataset_id,
+            "targets": targets,
+            "in_place": in_place,
+            "total_items": total_items,
+            "processed_items": 0,
+            "failed_items": 0,
+            "skipped": skipped or {},
+            "shard_count": len(shards),
+            "done_shards": 0,
+            # Nothing to claim: no worker would ever complete an empty job
+            "status": "running" if shards else "completed",
+            "created_at": time.time(),
+        })
+
+    def get_job(self, task_id):
+        snapshot = self._job_ref(task_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def claim(self, worker_id, lease_seconds):
+        """
+        The expired-lease query needs the composite index on shards
+        (status, lease_expires) from firestore.indexes.json.
+        """
+        from firebase_admin import firestore
+
+        now = time.time()
+        for job in self.db.collection("jobs").where("status", "==", "running").stream():
+            shards = job.reference.collection("shards")
+            candidates = list(shards.where("status", "==", "pending").limit(self.CLAIM_BATCH).stream())
+            candidates += list(shards.where("status", "==", "leased")
+                                     .where("lease_expires", "<", now).limit(self.CLAIM_BATCH).stream())
+
+            for candidate in candidates:
+                @firestore.transactional
+                def lease(transaction, ref, job_ref):
+                    job = job_ref.get(transaction=transaction).to_dict()
+                    data = ref.get(transaction=transaction).to_dict()
+                    expired = data["status"] == "leased" and data.get("lease_expires", 0) < time.time()
+                    if data["status"] != "pending" and not expired:
+                        return None # Taken by another worker meanwhile
+                    if expired and data.get("attempts", 0) >= self.MAX_ATTEMPTS:
+                        # Given up: its outputs count as failed so the job can complete
+                        failed = abandoned_failures(json.loads(data["items"]), job["targets"],
+                                                    job["in_place"], data["attempts"])
+                        done = job.get("done_shards", 0) + 1
+                        transaction.update(ref, {"status": "failed", "failed": failed,
+                                                 "failed_count": len(failed)})
+                        transaction.update(job_ref, {
+                            "failed_items": job.get("failed_items", 0) + len(failed),
+                            "done_shards": done,
+                            "status": "completed" if done >= job.get("shard_count", 0) else "running",
+                        })
+                        return None
+                    update = {"status": "leased", "owner": worker_id,
+                              "lease_expires": time.time() + lease_seconds,
+                              "attempts": data.get("attempts", 0) + 1}
+                    transaction.update(ref, update)
+                    return {**data, **update}
+
+                data = lease(self.db.transaction(), candidate.reference, job.reference)
+                if data:
+                    return {"task_id": job.id, "shard_id": data["shard_id"], "owner": worker_id,
+                            "attempts": data["attempts"], "items": json.loads(data["items"])}
+        return None
+
+    def _holds_lease(self, data, shard):
+        return (data and data.get("status") == "leased" and data.get("owner") == shard["owner"]
+                and data.get("attempts") == shard["attempts"])
+
+    def heartbeat(self, shard, lease_seconds):
+        from firebase_admin import firestore
+
+        @firestore.transactional
+        def extend(transaction, ref):
+            if not self._holds_lease(ref.get(transaction=transaction).to_dict(), shard):
+                return False
+            transaction.update(ref, {"lease_expires": time.time() + lease_seconds})
+            return True
+
+        return extend(self.db.transaction(), self._shard_ref(shard))
+
+    def write_results(self, shard, values):
+        # Cell documents are keyed by row and column: rewriting is harmless
+        from firebase_service import firebase_service
+
+        job = self.get_job(shard["task_id"])
+        firebase_service.write_cells(job["dataset_id"], values)
+
+    def complete(self, shard, processed, failed):
+        from firebase_admin import firestore
+
+        @firestore.transactional
+        def finish(transaction, ref, job_ref):
+            job = job_ref.get(transaction=transaction).to_dict()
+            if not self._holds_lease(ref.get(transaction=transaction).to_dict(), shard):
+                return False
+            transaction.update(ref, {"status": "done", "processed": processed, "failed": failed,
+                                     "failed_count": len(failed)})
+            done = job.get("done_shards", 0) + 1
+            transaction.update(job_ref, {
+                "processed_items": job.get("processed_items", 0) + processed,
+                "failed_items": job.get("failed_items", 0) + len(failed),
+                "done_shards": done,
+                "status": "completed" if done >= job.get("shard_count", 0) else "running",
+            })
+            return True
+
+        return finish(self.db.transaction(), self._shard_ref(shard), self._job_ref(shard["task_id"]))
+
+    def has_work(self):
+        return any(True for _ in self.db.collection("jobs").where("status", "==", "running").limit(1).stream())
+
+    def get_progress(self, task_id):
+        job = self.get_job(task_id)
+        if job is None:
+            return None
+        shards = self._job_ref(task_id).collection("shards")
+        now = time.time()
+        workers = sorted({s.to_dict().get("owner") for s in shards.where("status", "==", "leased").stream()
+                          if s.to_dict().get("lease_expires", 0) >= now})
+        return {
+            "total_items": job["total_items"],
+            "processed_items": job["processed_items"],
+            "status": job["status"],
+            "failed_items": job.get("failed_items", 0),
+            "shards": {"done": job.get("done_shards", 0), "total": job.get("shard_count", 0)},
+            "workers": workers,
+        }
+
+    def get_failures(self, task_id, offset=0, limit=None):
+        """
+        Returns the failed ledger entries of a job, optionally a page of them.
+        """
+        shards = self._job_ref(task_id).collection("shards")
+        failed = []
+        for snapshot in shards.where("failed_count", ">", 0).stream():
+            failed.extend(snapshot.to_dict().get("failed", []))
+        failed.sort(key=lambda item: item["row"])
+        return failed[offset:offset + limit if limit is not None else None]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_shard_store():
+    """
+    Returns the configured shard store: SHARD_STORE=sqlite:///path/to/file.db
+    for a local stand-in, Firestore otherwise (None if it is not connected).
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            url = os.getenv("SHARD_STORE", "firestore")
+            if url.startswith("sqlite:///"):
+                _store = SQLiteShardStore(url[len("sqlite:///"):])
+            else:
+                from firebase_service import firebase_service
+                if firebase_service.db:
+                    _store = FirestoreShardStore(firebase_service.db)
+        return _store
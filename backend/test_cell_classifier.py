@@ -0,0 +1,59 @@
+import pandas as pd
+
+from cell_classifier import CellClassifier
+
+
+def test_classify_values():
+    classifier = CellClassifier()
+    values = pd.Series([
+        "12,5%",
+        "https://example.com/a?b=1",
+        "someone@example.org",
+        "550e8400-e29b-41d4-a716-446655440000",
+        "for (int i=0;i<n;i++) { x[i] = 0; }",
+        "Translate this sentence, please.",
+    ])
+    reasons = classifier.classify_values(values).tolist()
+    assert reasons == ['number', 'url', 'email', 'id', 'code', '']
+
+
+def test_classify_marks_columns_and_languages():
+    classifier = CellClassifier()
+    classifier.model = None # use the Vietnamese heuristic
+    df = pd.DataFrame({
+        "id": ["a-1", "a-2", "a-3"],
+        "text": ["Hello there, how are you today?", "Xin chào, bạn là ai và bạn có thể làm gì?", ""],
+    })
+    skipped, languages, skipped_columns = classifier.classify(df, [0, 1, 2], ["id", "text"])
+
+    assert skipped_columns == ["id"]
+    assert skipped[(0, "id")] == "id"
+    assert (2, "text") not in skipped
+    assert languages == {(1, "text"): "vi"}
+
+
+def test_prose_with_symbols_is_translated():
+    classifier = CellClassifier()
+    values = pd.Series([
+        "Solve $x^2 = 4$ for x.",
+        "What is f(x) = 2x + 1?",
+        "Use the [link] (see below).",
+        "<b>Hello</b> world, this is bold.",
+        "e.g. (a), (b), (c)",
+        "COVID-19",
+        "Python3",
+        "x = foo(bar); y = 2;",
+    ])
+    reasons = classifier.classify_values(values).tolist()
+    assert reasons == ['', '', '', '', '', '', '', 'code']
+
+
+def test_vietnamese_names_in_english_prose():
+    classifier = CellClassifier()
+    classifier.model = None
+    values = pd.Series([
+        "Hello, my name is Nguyễn Văn Đức and I live here.",
+        "Il a été élevé à côté de la forêt près du château.",
+        "Tôi tên là Nguyễn Văn Đức và tôi sống ở đây.",
+    ])
+    assert classifier.detect_languages(values).tolist() == ['', '', 'vi']
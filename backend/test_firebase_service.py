@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pandas as pd
+
+from benchmarks.fakes import InMemoryFirestore
+from firebase_service import FirebaseService
+
+
+def make_service(latency=0.0):
+    service = FirebaseService()
+    service.db = InMemoryFirestore(latency=latency)
+    return service
+
+
+def test_version_never_goes_backwards_during_flushes():
+    service = make_service(latency=0.001)
+    dataset_id = service.create_dataset("a.csv", [{"key": "text"}])
+    stop = threading.Event()
+    seen = []
+
+    def read():
+        versions = []
+        while not stop.is_set():
+            versions.append(service.get_version(dataset_id))
+        seen.append(versions)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for _ in range(30):
+        service.bump_version(dataset_id)
+        service.flush_versions()
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    for versions in seen:
+        assert versions == sorted(versions)
+    assert service.get_version(dataset_id) == 30
+    assert service.db.collection("datasets").document(dataset_id).get().to_dict()["version"] == 30
+
+
+def test_changed_cells_are_read_since_a_time():
+    service = make_service()
+    dataset_id = service.create_dataset("a.csv", [{"key": "text"}])
+    service.save_cells(dataset_id, pd.DataFrame({"text": ["Hello", "Bye"]}))
+    since = time.time()
+    assert service.get_changed_cells(dataset_id, since + 1) == []
+
+    service.write_cells(dataset_id, [(1, "text_vi", "Tạm biệt")])
+    changed = service.get_changed_cells(dataset_id, since)
+    assert [(cell["row_idx"], cell["col_key"], cell["value"]) for cell in changed] == [(1, "text_vi", "Tạm biệt")]
+
+
+def test_revision_writes_changed_cells_and_deletes_removed_ones():
+    service = make_service()
+    dataset_id = service.create_dataset("a.csv", [{"key": "text"}, {"key": "notes"}])
+    service.save_cells(dataset_id, pd.DataFrame({"text": ["Hello", "Bye", "Later"], "notes": ["a", "b", "c"]}))
+    service.write_cells(dataset_id, [(row, "text_vi", f"Bản dịch {row}") for row in range(3)])
+    before = {(cell["row_idx"], cell["col_key"]): cell for cell in service.get_cells(dataset_id)}
+
+    # Row 1 edited, row 2 and the notes column dropped
+    changed, unchanged, removed = service.save_revision(
+        dataset_id, pd.DataFrame({"text": ["Hello", "Goodbye"]}), [{"key": "text"}], "b.csv")
+    assert changed == [(1, "text")]
+    assert (unchanged, removed) == (1, 5)
+
+    after = {(cell["row_idx"], cell["col_key"]): cell for cell in service.get_cells(dataset_id)}
+    assert set(after) == {(0, "text"), (1, "text"), (0, "text_vi"), (1, "text_vi")}
+    assert after[(1, "text")]["value"] == "Goodbye"
+    # Nothing else was rewritten, translations included
+    for key in [(0, "text"), (0, "text_vi"), (1, "text_vi")]:
+        assert after[key] == before[key]
+    meta = service.get_dataset_meta(dataset_id)
+    assert (meta["filename"], meta["revision"]) == ("b.csv", 2)
@@ -0,0 +1,36 @@
+import gzip
+from types import SimpleNamespace
+
+from http_cache import cached_response, dataset_etag
+
+
+def make_request(**headers):
+    return SimpleNamespace(headers=headers)
+
+
+def test_etag_round_trip_gives_304():
+    etag = dataset_etag("d1", 7, 1, 100, "rows")
+    assert etag == 'W/"d1-7-1-100-rows"'
+
+    response = cached_response(make_request(), b"{}", "application/json", etag)
+    assert response.status_code == 200
+    assert response.headers["etag"] == etag
+
+    response = cached_response(make_request(**{"if-none-match": '"d1-7-1-100-rows"'}), b"{}", "application/json", etag)
+    assert response.status_code == 304
+
+    # A newer dataset version no longer matches
+    newer = dataset_etag("d1", 8, 1, 100, "rows")
+    response = cached_response(make_request(**{"if-none-match": etag}), b"{}", "application/json", newer)
+    assert response.status_code == 200
+
+
+def test_large_bodies_are_compressed():
+    body = b'{"rows":[' + b'["hello","xin chao"],' * 200 + b'[]]}'
+    response = cached_response(make_request(**{"accept-encoding": "gzip, deflate"}), body, "application/json")
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == body
+
+    response = cached_response(make_request(**{"accept-encoding": "gzip;q=0"}), body, "application/json")
+    assert "content-encoding" not in response.headers
+    assert response.body == body
@@ -0,0 +1,52 @@
+import json
+
+from json_paths import compile_selector, flatten_selected, iter_leaves, renest
+
+
+def test_compile_selector():
+    assert compile_selector("*.messages.*.content").fullmatch("0.messages.3.content")
+    assert not compile_selector("*.messages.*.content").fullmatch("0.messages.3.role")
+    assert compile_selector("**.content").fullmatch("content")
+    assert compile_selector("**.content").fullmatch("a.b.content")
+    assert compile_selector("$[*].messages[*].content").fullmatch("0.messages.1.content")
+    assert compile_selector("$..content").fullmatch("0.messages.1.content")
+    assert not compile_selector("$[0].id").fullmatch("1.id")
+
+
+def test_iter_leaves_matches_flatten_order():
+    data = {"a": [1, {"b": "x"}], "c": None}
+    assert list(iter_leaves(data)) == [("a.0", 1), ("a.1.b", "x"), ("c", None)]
+
+
+def test_flatten_selected_round_trip():
+    data = [
+        {"id": 7, "messages": [
+            {"role": "user", "content": "Hi", "score": 0.5},
+            {"role": "assistant", "content": "Hello!"},
+        ]},
+        {"id": 8, "messages": [{"role": "user", "content": "Bye"}]},
+    ]
+    cells, skeleton = flatten_selected(data, ["*.messages.*.content"])
+
+    assert cells == [("0.messages.0.content", "Hi"), ("0.messages.1.content", "Hello!"),
+                     ("1.messages.0.content", "Bye")]
+    # Skeleton survives storage as JSON and re-nests losslessly
+    skeleton = json.loads(json.dumps(skeleton))
+    assert renest(skeleton, [value for _, value in cells]) == data
+
+    translated = renest(skeleton, ["Chào", "Xin chào!", "Tạm biệt"])
+    assert translated[0]["messages"][1] == {"role": "assistant", "content": "Xin chào!"}
+    assert translated[0]["id"] == 7
+
+
+def test_deep_documents_do_not_recurse():
+    data = "leaf"
+    for _ in range(5000):
+        data = {"a": [data]}
+    selector = ".".join(["a", "0"] * 5000)
+    cells, skeleton = flatten_selected(data, [selector])
+    assert cells == [(selector, "leaf")]
+    node = renest(skeleton, ["lá"])
+    for _ in range(5000):
+        node = node["a"][0]
+    assert node == "lá"
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.fakes import FakeTranslatorFactory, InMemoryFirestore
+from firebase_service import firebase_service
+from progress_tracker import progress_tracker
+from translation_service import translation_service
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(firebase_service, "db", InMemoryFirestore())
+    monkeypatch.setattr(progress_tracker, "storage_file", os.path.join(tmp_path, "progress.json"))
+    monkeypatch.setattr(progress_tracker, "failures_file", os.path.join(tmp_path, "progress.failed.json"))
+    monkeypatch.setattr(progress_tracker, "tasks", {})
+    monkeypatch.setattr(progress_tracker, "failures", {})
+    monkeypatch.setattr(translation_service, "translator_factory", FakeTranslatorFactory(latency=0.001))
+    monkeypatch.setattr(translation_service, "JITTER_SECONDS", (0, 0))
+    return TestClient(main.app)
+
+
+def upload(client, csv, dataset_id=None):
+    data = {"dataset_id": dataset_id} if dataset_id else {}
+    response = client.post("/upload", files={"file": ("a.csv", csv.encode("utf-8"), "text/csv")}, data=data)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_revision_retranslates_only_changed_outputs(client):
+    dataset_id = upload(client, "text,title\nGood morning,First post\nGood night,Second post\n")["dataset_id"]
+    firebase_service.record_translation(dataset_id, ["text"], ["vi", "de"])
+    firebase_service.record_translation(dataset_id, ["title"], ["de"])
+    firebase_service.write_cells(dataset_id, [(row, col, "old") for row in range(2)
+                                              for col in ("text_vi", "text_de", "title_de")])
+
+    # Background tasks run before the test client returns
+    result = upload(client, "text,title\nGood morning,First post!\nGood evening,Second post\n", dataset_id)
+    assert (result["changed_cells"], result["unchanged_cells"], result["removed_cells"]) == (2, 2, 0)
+    # Both columns' languages share one run, keyed by the dataset
+    assert result["task_ids"] == [dataset_id]
+    task = progress_tracker.get_task(dataset_id)
+    assert task["status"] == "completed"
+    assert task["processed_items"] == 3
+
+    values = {(cell["row_idx"], cell["col_key"]): cell["value"] for cell in firebase_service.get_cells(dataset_id)}
+    assert values[(1, "text_vi")] == "[vi] Good evening"
+    assert values[(1, "text_de")] == "[de] Good evening"
+    assert values[(0, "title_de")] == "[de] First post!"
+    # Outputs of unchanged cells are kept
+    assert values[(0, "text_vi")] == values[(0, "text_de")] == values[(1, "title_de")] == "old"
@@ -0,0 +1,20 @@
+from metrics import MetricsRegistry
+
+
+def test_render_prometheus_format():
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls.", ["op"])
+    latency = registry.histogram("latency_seconds", "Latency.", [], buckets=(0.1, 1))
+
+    calls.inc(op="get")
+    calls.inc(2, op="get")
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    text = registry.render()
+    assert '# TYPE calls_total counter' in text
+    assert 'calls_total{op="get"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert 'latency_seconds_count 2' in text
@@ -50,5 +50,38 @@ And normal text.
 
     print("\n[PASS] All tests passed!")
 
+def test_split_packed_mode():
+    text = "First line.\nSecond line.\n\n```python\nx = 1\n```\nThird line.\n"
+    segments = TextPreprocessor.split(text, max_length=100)
+
+    # Reassembly is exact
+    assert "".join(s['content'] for s in segments) == text
+
+    # Lines around the code block are packed, the code block is untouched
+    contents = [s['content'] for s in segments]
+    assert "First line.\nSecond line." in contents
+    assert "```python\nx = 1\n```" in contents
+    packed = next(s for s in segments if s['content'] == "First line.\nSecond line.")
+    assert [p['content'] for p in packed['parts']] == ["First line.", "\n", "Second line."]
+
+
+def test_split_packed_mode_respects_max_length():
+    paragraph = " ".join(f"Sentence number {i} is here." for i in range(200))
+    text = paragraph + "\n" + "short tail"
+    segments = TextPreprocessor.split(text, max_length=300)
+
+    assert "".join(s['content'] for s in segments) == text
+    assert all(len(s['content']) <= 300 for s in segments)
+    # Oversized text is cut after a full stop
+    pieces = [s['content'] for s in segments if s['content'].startswith("Sentence")]
+    assert len(pieces) > 1
+    assert all(p.endswith(". ") or p.endswith(".") for p in pieces)
+
+
+def test_split_sentences_hard_cut():
+    word = "x" * 50
+    pieces = TextPreprocessor.split_sentences(word, 20)
+    assert pieces == ["x" * 20, "x" * 20, "x" * 10]
+
 if __name__ == "__main__":
     test_preprocessor()
@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+from progress_tracker import ProgressTracker
+
+
+def test_increment_is_flushed_in_background(tmp_path):
+    storage_file = os.path.join(tmp_path, "progress.json")
+    tracker = ProgressTracker(storage_file)
+    tracker.init_task("t1", 10)
+
+    for _ in range(4):
+        tracker.increment("t1", 1, chars=5)
+
+    # Readers see the counter immediately
+    task = tracker.get_task("t1")
+    assert task["processed_items"] == 4
+    assert task["processed_chars"] == 20
+
+    # Disk catches up within the flush interval
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        with open(storage_file, encoding='utf-8') as f:
+            if json.load(f)["t1"]["processed_items"] == 4:
+                break
+        time.sleep(0.05)
+    else:
+        raise AssertionError("progress was not flushed")
+
+
+def test_status_is_persisted_immediately(tmp_path):
+    storage_file = os.path.join(tmp_path, "progress.json")
+    tracker = ProgressTracker(storage_file)
+    tracker.init_task("t1", 1)
+    tracker.update_status("t1", "paused")
+
+    with open(storage_file, encoding='utf-8') as f:
+        assert json.load(f)["t1"]["status"] == "paused"
+
+
+def test_failed_ledger(tmp_path):
+    storage_file = os.path.join(tmp_path, "progress.json")
+    tracker = ProgressTracker(storage_file)
+    tracker.init_task("t1", 3)
+    tracker.record_failure("t1", 2, "text", "text_de", "de", "ConnectionError", 5)
+    tracker.record_failure("t1", 2, "text", "text_de", "de", "TimeoutError", 5)
+    tracker.record_failure("t1", 0, "text", "text_de", "de", "TimeoutError", 5)
+
+    task = tracker.get_task("t1")
+    assert task["processed_items"] == 0
+    assert task["failed_items"] == 2
+    assert "failed" not in task
+    assert tracker.get_failures("t1")[0]["error"] == "TimeoutError"
+    assert [item["row"] for item in tracker.get_failures("t1", offset=1, limit=1)] == [0]
+
+    # The ledger is stored apart from the progress counters
+    tracker.flush()
+    with open(storage_file, encoding='utf-8') as f:
+        assert "failed" not in json.load(f)["t1"]
+    assert len(ProgressTracker(storage_file).get_failures("t1")) == 2
+
+
+def test_interrupted_task_resumes(tmp_path):
+    storage_file = os.path.join(tmp_path, "progress.json")
+    tracker = ProgressTracker(storage_file)
+    assert tracker.init_task("t1", 10, fingerprint="abc") == 0
+    tracker.increment("t1", 4)
+    tracker.set_current_index("t1", 4)
+    tracker.flush()
+
+    tracker.record_failure("t1", 2, "text", "text", "vi", "TimeoutError", 5)
+    tracker.record_failure("t1", 6, "text", "text", "vi", "TimeoutError", 5)
+    tracker.flush()
+
+    # After a restart, the same work picks up where it stopped. Counters are
+    # rebuilt from the resume point: row 6 lies after it and runs again
+    tracker = ProgressTracker(storage_file)
+    assert tracker.init_task("t1", 10, fingerprint="abc") == 4
+    tracker.rebase_task("t1", 3, 30, lambda item: item["row"] < 4)
+    task = tracker.get_task("t1")
+    assert (task["processed_items"], task["failed_items"]) == (3, 1)
+    assert [item["row"] for item in tracker.get_failures("t1")] == [2]
+
+    # Other work, or a completed run, starts over
+    assert tracker.init_task("t1", 10, fingerprint="xyz") == 0
+    tracker.set_current_index("t1", 10)
+    tracker.update_status("t1", "completed")
+    assert tracker.init_task("t1", 10, fingerprint="xyz") == 0
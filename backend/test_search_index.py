@@ -0,0 +1,99 @@
+import hashlib
+import re
+
+from search_index import SearchIndex
+
+
+def content_hash(value):
+    return hashlib.sha1(str(value).encode('utf-8')).hexdigest()
+
+
+def make_index():
+    index = SearchIndex()
+    cells = []
+    for row, text in enumerate(["Hello world", "Use `print(x)` here", "Good morning"]):
+        cells.append({"row_idx": row, "col_key": "text", "value": text,
+                      "source_hash": content_hash(text), "updated_at": 100.0})
+    cells.append({"row_idx": 0, "col_key": "text_vi", "value": "Xin chào thế giới", "updated_at": 100.0})
+    cells.append({"row_idx": 2, "col_key": "text_vi", "value": "Good morning", "updated_at": 100.0})
+    index.build("d1", cells)
+    return index
+
+
+def test_full_text_search_on_source_and_output():
+    index = make_index()
+    dataset = index.ensure("d1", lambda: [])
+    pairs = [("text", "text_vi")]
+
+    assert set(index.search(dataset, pairs, "hello")) == {0}
+    # Last word matches as a prefix, on translated values too
+    results = index.search(dataset, pairs, "chào thế gi")
+    assert [col for col, _ in results[0]] == ["text_vi"]
+    assert set(index.search(dataset, pairs, "morning")) == {2}
+
+
+def test_filters_and_updates():
+    index = make_index()
+    dataset = index.ensure("d1", lambda: [])
+    pairs = [("text", "text_vi")]
+
+    assert set(index.search(dataset, pairs, filters=["untranslated"])) == {1}
+    assert set(index.search(dataset, pairs, filters=["identical"])) == {2}
+    protected = re.compile(r'`[^`\n]+`')
+    assert set(index.search(dataset, pairs, filters=["protected"], protected=protected)) == {1}
+
+    index.update("d1", 1, "text_vi", "Dùng `print(x)` ở đây", updated_at=200.0)
+    assert set(index.search(dataset, pairs, filters=["untranslated"])) == set()
+    assert set(index.search(dataset, pairs, filters=["changed_since"], changed_since=150.0)) == {1}
+    assert set(index.search(dataset, pairs, "đây")) == {1}
+
+    # In place: untranslated cells still hold their uploaded value
+    index.update("d1", 0, "text", "Xin chào", updated_at=200.0)
+    results = index.search(dataset, [("text", None)], filters=["untranslated"], hash_value=content_hash)
+    assert set(results) == {1, 2}
+
+
+def test_foreign_writes_rebuild_the_index():
+    index = SearchIndex()
+    index.build("d1", [{"row_idx": 0, "col_key": "text", "value": "Hello"}], version=0)
+    index.advance("d1") # Local write, already applied
+    loads = []
+    load = lambda: loads.append(1) or [{"row_idx": 0, "col_key": "text", "value": "Hello"},
+                                       {"row_idx": 0, "col_key": "text_vi", "value": "Xin chào"}]
+
+    dataset = index.ensure("d1", load, version=1)
+    assert not loads
+    # A worker in another process wrote the translation and bumped the version
+    dataset = index.ensure("d1", load, version=2)
+    assert loads == [1]
+    assert set(index.search(dataset, [("text", "text_vi")], "chào")) == {0}
+    assert index.ensure("d1", load, version=2) is dataset
+
+
+def test_foreign_writes_refresh_only_changed_cells():
+    index = SearchIndex()
+    index.build("d1", [{"row_idx": 0, "col_key": "text", "value": "Hello", "updated_at": 100.0}], version=0)
+    dataset = index.ensure("d1", lambda: [], version=0)
+    reads = []
+
+    def load_changed(since):
+        reads.append(since)
+        return [{"row_idx": 0, "col_key": "text_vi", "value": "Xin chào", "updated_at": since + 1}]
+
+    full_loads = []
+    load = lambda: full_loads.append(1) or []
+    # Each worker batch bumps the version; only the changed cells are read
+    assert index.ensure("d1", load, version=3, load_changed=load_changed) is dataset
+    assert index.ensure("d1", load, version=3, load_changed=load_changed) is dataset
+    assert not full_loads
+    assert len(reads) == 1
+    assert set(index.search(dataset, [("text", "text_vi")], "chào")) == {0}
+
+    # A later local write is kept over an older stored value
+    index.update("d1", 0, "text_vi", "Chào bạn", updated_at=reads[0] + 10)
+    index.ensure("d1", load, version=4, load_changed=load_changed)
+    assert dataset.value(0, "text_vi") == "Chào bạn"
+    # A failed read falls back to a rebuild on the next search
+    index.ensure("d1", load, version=5, load_changed=lambda since: None)
+    assert index.ensure("d1", load, version=5, load_changed=load_changed) is not dataset
+    assert full_loads == [1]
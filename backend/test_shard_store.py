@@ -0,0 +1,72 @@
+import os
+import time
+
+from shard_store import SQLiteShardStore
+
+
+def make_store(tmp_path, shards=2):
+    store = SQLiteShardStore(os.path.join(tmp_path, "shards.db"))
+    items = [[[i, "text", f"cell {i}", {}]] for i in range(shards)]
+    store.create_job("t1", "d1", ["vi"], True, items, total_items=shards)
+    return store
+
+
+def test_each_shard_is_leased_once(tmp_path):
+    store = make_store(tmp_path)
+    a = store.claim("a", lease_seconds=60)
+    b = store.claim("b", lease_seconds=60)
+    assert {a["shard_id"], b["shard_id"]} == {0, 1}
+    assert store.claim("c", lease_seconds=60) is None
+
+    assert store.complete(a, 1, [])
+    assert store.complete(b, 0, [{"row": 1, "error": "ConnectionError"}])
+    progress = store.get_progress("t1")
+    assert progress["status"] == "completed"
+    assert progress["processed_items"] == 1
+    assert progress["failed_items"] == 1
+    assert not store.has_work()
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    store = make_store(tmp_path, shards=1)
+    dead = store.claim("dead", lease_seconds=0.01)
+    time.sleep(0.05)
+
+    alive = store.claim("alive", lease_seconds=60)
+    assert alive["shard_id"] == dead["shard_id"]
+    assert alive["attempts"] == 2
+
+    # The dead worker's lease token no longer holds
+    assert not store.heartbeat(dead, 60)
+    assert not store.complete(dead, 1, [])
+    assert store.heartbeat(alive, 60)
+
+    # Writing a shard twice leaves one result per cell
+    store.write_results(dead, [(0, "text", "ô 0")])
+    store.write_results(alive, [(0, "text", "ô 0")])
+    assert store.complete(alive, 1, [])
+    assert store.get_results("t1") == {(0, "text"): "ô 0"}
+    assert store.get_progress("t1")["processed_items"] == 1
+
+
+def test_abandoned_shard_counts_as_failed(tmp_path):
+    store = SQLiteShardStore(os.path.join(tmp_path, "shards.db"))
+    store.MAX_ATTEMPTS = 1
+    items = [[[0, "text", "cell 0", {}], [1, "text", "cell 1", {"de": "number"}]]]
+    store.create_job("t1", "d1", ["vi", "de"], False, items, total_items=3)
+    store.claim("dead", lease_seconds=0.01)
+    time.sleep(0.05)
+
+    assert store.claim("alive", lease_seconds=60) is None
+    progress = store.get_progress("t1")
+    assert progress["status"] == "completed"
+    assert progress["processed_items"] + progress["failed_items"] == 3
+    failures = store.get_failures("t1")
+    assert {(item["row"], item["output_col"]) for item in failures} == {(0, "text_vi"), (0, "text_de"), (1, "text_vi")}
+    assert failures[0]["error"] == "ShardAbandoned"
+
+
+def test_empty_job_is_created_completed(tmp_path):
+    store = make_store(tmp_path, shards=0)
+    assert store.get_progress("t1")["status"] == "completed"
+    assert not store.has_work()
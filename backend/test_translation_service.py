@@ -0,0 +1,152 @@
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.fakes import FakeTranslatorFactory, InMemoryFirestore
+from firebase_service import firebase_service
+from progress_tracker import progress_tracker
+from translation_service import TranslationService
+
+
+@pytest.fixture
+def service(tmp_path):
+    # The loop reports to the tracker singleton: keep it away from progress.json
+    progress_tracker.storage_file = os.path.join(tmp_path, "progress.json")
+    progress_tracker.failures_file = os.path.join(tmp_path, "progress.failed.json")
+    progress_tracker.tasks = {}
+    progress_tracker.failures = {}
+    service = TranslationService()
+    service.translator_factory = FakeTranslatorFactory(latency=0.001)
+    service.JITTER_SECONDS = (0, 0)
+    service.CHUNK_SIZE = 50
+    return service
+
+
+def make_df(rows):
+    return pd.DataFrame({"text": [f"Sentence number {i} about the weather today." for i in range(rows)]})
+
+
+def test_stop_mid_chunk_leaves_unwritten_items_to_the_rerun(service):
+    df = make_df(150)
+    factory = service.translator_factory
+    original = factory.__call__
+
+    def stopping_factory(target):
+        translator = original(target)
+        translate = translator.translate
+
+        def translate_then_stop(text):
+            if factory.calls >= 8:
+                progress_tracker.update_status("t1", "stopped")
+            return translate(text)
+        translator.translate = translate_then_stop
+        return translator
+    service.translator_factory = stopping_factory
+
+    service.run_translation_task("t1", df, list(range(150)), ["text"])
+    task = progress_tracker.get_task("t1")
+    assert task["status"] == "stopped"
+    written = sum(value.startswith("[vi]") for value in df["text"])
+    assert task["processed_items"] == written < 50
+    # Nothing unwritten lies before the resume point
+    assert all(value.startswith("[vi]") for value in df["text"][:task["current_index"]])
+
+    service.translator_factory = factory
+    service.run_translation_task("t1", df, list(range(150)), ["text"])
+    task = progress_tracker.get_task("t1")
+    assert task["status"] == "completed"
+    assert all(value.startswith("[vi]") for value in df["text"])
+    assert task["processed_items"] == 150
+
+
+def test_outputs_translate_only_the_requested_targets(service):
+    df = make_df(3)
+    df["text_vi"] = "kept"
+    df["text_de"] = "kept"
+
+    service.run_translation_task("t1", df, [], [], None, ["vi", "de"], None,
+                                 [(0, "text", "de"), (1, "text", "vi"), (1, "text", "de")])
+    task = progress_tracker.get_task("t1")
+    assert task["status"] == "completed"
+    assert task["total_items"] == task["processed_items"] == 3
+    assert list(df["text_vi"]) == ["kept", "[vi] " + df["text"][1], "kept"]
+    assert list(df["text_de"]) == ["[de] " + df["text"][0], "[de] " + df["text"][1], "kept"]
+
+
+def test_fan_out_to_targets_with_their_glossaries(service, monkeypatch):
+    monkeypatch.setattr(firebase_service, "db", InMemoryFirestore())
+    firebase_service.add_glossary_term("weather", "Wetter", "pre", "de")
+    firebase_service.add_glossary_term("today", "hôm nay", "post", "vi")
+    # No language: applies to every target
+    firebase_service.add_glossary_term("night", "NIGHT", "post")
+    # Two distinct texts, each repeated
+    df = pd.DataFrame({"text": ["The weather today.", "Good night.", "The weather today.", "Good night."]})
+
+    service.run_translation_task("t1", df, list(range(4)), ["text"], None, ["vi", "de", "fr"])
+    task = progress_tracker.get_task("t1")
+    assert task["status"] == "completed"
+    assert task["processed_items"] == 12
+
+    # Each (target, segment) pair is sent once, whatever the repeats
+    calls = {}
+    for translator in service.translator_factory.translators:
+        calls[translator.target] = calls.get(translator.target, 0) + translator.calls
+    assert calls == {"vi": 2, "de": 2, "fr": 2}
+
+    # Pre-glossaries change what a target sends, post-glossaries what it writes
+    assert list(df["text_vi"]) == ["[vi] The weather hôm nay.", "[vi] Good NIGHT."] * 2
+    assert list(df["text_de"]) == ["[de] The Wetter today.", "[de] Good NIGHT."] * 2
+    assert list(df["text_fr"]) == ["[fr] The weather today.", "[fr] Good NIGHT."] * 2
+
+
+def test_hint_mid_job_runs_the_hinted_rows_next_then_background_order(service):
+    df = make_df(300)
+    chunks = []
+    translate_chunk = service.translate_chunk
+
+    def recording_translate_chunk(chunk_items, *args, **kwargs):
+        chunks.append([row for row, _, _ in chunk_items])
+        if len(chunks) == 1:
+            # The grid scrolls while the first chunk is in flight
+            assert service.set_priority("t1", 229, 200)
+        return translate_chunk(chunk_items, *args, **kwargs)
+    service.translate_chunk = recording_translate_chunk
+
+    service.run_translation_task("t1", df, list(range(300)), ["text"])
+    assert chunks[0] == list(range(0, 50))
+    assert chunks[1] == list(range(200, 230))
+    # Then back to the background order, which skips the hinted rows
+    assert chunks[2] == list(range(50, 100))
+    assert chunks[4] == list(range(150, 200))
+    assert chunks[5] == list(range(230, 280))
+    assert chunks[6] == list(range(280, 300))
+    assert len(chunks) == 7
+    assert "t1" not in service.priorities
+    assert progress_tracker.get_task("t1")["processed_items"] == 300
+    assert all(value.startswith("[vi]") for value in df["text"])
+
+
+def test_plan_counts_segments_dedups_and_peeks_the_cache(service):
+    df = pd.DataFrame({"text": ["Hello world, how are you?", "Hello world, how are you?",
+                                "Run `make test` before you push.", "12345"]})
+    service.cache_put("Hello world, how are you?", "Xin chào", "vi")
+    service.cache_put("Good night.", "Chúc ngủ ngon.", "vi")
+    order = list(service.cache)
+
+    plan = service.plan_translation(df, range(4), ["text"], ("vi", "de"))
+    assert plan["cells"] == 4
+    assert plan["skipped"] == {"number": 2} # One per target
+    # Split once for both targets: one segment per greeting, three around the code span
+    assert plan["segments"] == 5
+    assert plan["protected_segments"] == 1
+    assert plan["translatable_segments"] == 4
+    # Greeting, "Run " and " before you push." per target
+    assert plan["unique_segments"] == 6
+    assert plan["cache_hits"] == 1
+    assert plan["cache_hit_ratio"] == pytest.approx(1 / 6)
+    assert plan["estimated_requests"] == 5
+
+    # A dry run: no backend call and the cache order is untouched
+    assert service.translator_factory.calls == 0
+    assert list(service.cache) == order
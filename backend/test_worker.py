@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+from shard_store import SQLiteShardStore
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_workers_share_a_job(tmp_path):
+    path = os.path.join(tmp_path, "shards.db")
+    store = SQLiteShardStore(path)
+    shards = [[[row, "text", f"sentence number {row}", {}] for row in range(start, start + 5)]
+              for start in range(0, 40, 5)]
+    store.create_job("t1", "d1", ["vi", "de"], False, shards, total_items=80)
+
+    env = {**os.environ, "SHARD_STORE": f"sqlite:///{path}"}
+    workers = [subprocess.Popen([sys.executable, "worker.py", "--exit-when-idle", "--fake-latency", "0.001",
+                                 "--worker-id", f"w{i}"], cwd=BACKEND_DIR, env=env)
+               for i in range(3)]
+    for worker in workers:
+        assert worker.wait(timeout=120) == 0
+
+    progress = store.get_progress("t1")
+    assert progress["status"] == "completed"
+    assert progress["processed_items"] == 80
+    results = store.get_results("t1")
+    assert len(results) == 80
+    assert results[(7, "text_de")] == "[de] sentence number 7"
@@ -21,11 +21,20 @@ class TextPreprocessor:
     
     PATTERN = re.compile(r'(```[\s\S]*?```|\$\$[\s\S]*?\$\$|`[^`\n]+`|<think>[\s\S]*?</think>)')
 
+    # Upper bound for a single backend request. The translator rejects
+    # anything above ~5000 characters, so keep a safety margin.
+    MAX_SEGMENT_LENGTH = 4500
+
+    # Sentence boundary: terminal punctuation (optionally followed by closing
+    # quotes/brackets) and the whitespace after it. The whitespace stays with
+    # the preceding sentence so that pieces concatenate back to the input.
+    SENTENCE_END = re.compile(r'(?<=[.!?\u3002\uff01\uff1f])["\'\)\]\u201d\u2019]*\s+')
+
     @staticmethod
-    def split(text, custom_patterns=None):
+    def compile_patterns(custom_patterns=None):
         """
-        Splits text into segments of (is_translatable, content).
-        custom_patterns: List of dicts [{'start': '...', 'end': '...'}]
+        Returns the regex matching protected (non-translatable) spans: code,
+        LaTeX and the custom start/end patterns.
         """
         # Base patterns
         patterns = [
@@ -44,7 +53,21 @@ class TextPreprocessor:
 
         # Combine into one regex
         full_pattern = '|'.join(f'({p})' for p in patterns)
-        regex = re.compile(full_pattern)
+        return re.compile(full_pattern)
+
+    @staticmethod
+    def split(text, custom_patterns=None, max_length=None):
+        """
+        Splits text into segments of (is_translatable, content).
+        custom_patterns: List of dicts [{'start': '...', 'end': '...'}]
+        max_length: When set, switches to packed mode. Adjacent text segments
+            (including the newlines between them) are merged up to max_length
+            characters, and oversized text is cut at sentence boundaries.
+            Packed segments carry a 'parts' list holding the line-level
+            segments they were built from.
+        In both modes ''.join(s['content'] for s in segments) == text.
+        """
+        regex = TextPreprocessor.compile_patterns(custom_patterns)
 
         # re.split with capturing group returns [text, delimiter, text, delimiter, ...]
         parts = regex.split(text)
@@ -67,9 +90,108 @@ class TextPreprocessor:
                     if not sub:
                         continue
                     segments.append({'type': 'text', 'content': sub})
-                
+
+        if max_length:
+            segments = TextPreprocessor.pack(segments, max_length)
+
         return segments
 
+    @staticmethod
+    def pack(segments, max_length):
+        """
+        Merges runs of adjacent text segments into segments of at most
+        max_length characters. Protected (non_text) segments are never merged
+        and act as hard boundaries. Leading/trailing newline runs of a packed
+        segment are emitted as their own segments so they never reach the
+        translator.
+        """
+        packed = []
+        run = []
+
+        def flush():
+            group = []
+            group_len = 0
+            for seg in run:
+                seg_len = len(seg['content'])
+                if group and group_len + seg_len > max_length:
+                    packed.extend(TextPreprocessor._merge(group))
+                    group = []
+                    group_len = 0
+                if seg_len > max_length:
+                    for piece in TextPreprocessor.split_sentences(seg['content'], max_length):
+                        packed.append({'type': 'text', 'content': piece})
+                    continue
+                group.append(seg)
+                group_len += seg_len
+            packed.extend(TextPreprocessor._merge(group))
+            run.clear()
+
+        for seg in segments:
+            if seg['type'] == 'text':
+                run.append(seg)
+            else:
+                flush()
+                packed.append(seg)
+        flush()
+        return packed
+
+    @staticmethod
+    def _merge(group):
+        # Drop whitespace-only segments at the edges of a group; they are
+        # passed through untouched instead of being sent for translation.
+        lead = []
+        while group and not group[0]['content'].strip():
+            lead.append(group.pop(0))
+        trail = []
+        while group and not group[-1]['content'].strip():
+            trail.insert(0, group.pop())
+        merged = list(lead)
+        if len(group) == 1:
+            merged.append(group[0])
+        elif group:
+            merged.append({
+                'type': 'text',
+                'content': ''.join(seg['content'] for seg in group),
+                'parts': group,
+            })
+        merged.extend(trail)
+        return merged
+
+    @staticmethod
+    def split_sentences(text, max_length):
+        """
+        Cuts text into pieces of at most max_length characters, preferring
+        sentence boundaries, then whitespace, then a hard cut.
+        """
+        pieces = []
+        current = ""
+        for sentence in TextPreprocessor._sentences(text):
+            if len(current) + len(sentence) <= max_length:
+                current += sentence
+                continue
+            if current:
+                pieces.append(current)
+                current = ""
+            while len(sentence) > max_length:
+                cut = sentence.rfind(' ', 0, max_length) + 1
+                if cut <= 0:
+                    cut = max_length
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:]
+            current = sentence
+        if current:
+            pieces.append(current)
+        return pieces
+
+    @staticmethod
+    def _sentences(text):
+        start = 0
+        for match in TextPreprocessor.SENTENCE_END.finditer(text):
+            yield text[start:match.end()]
+            start = match.end()
+        if start < len(text):
+            yield text[start:]
+
     @staticmethod
     def extract(text):
         # Legacy method kept for compatibility if needed, but we are moving to split-merge
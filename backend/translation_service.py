@@ -1,172 +1,773 @@
+import hashlib
+import json
 import os
+import re
 import traceback
 import time
 import random
+import threading
 import concurrent.futures
+from collections import OrderedDict, deque
 from deep_translator import GoogleTranslator
+import metrics
+
+class SegmentFailed(Exception):
+    """
+    Raised when a segment could not be translated after every retry.
+    """
+    def __init__(self, error, attempts):
+        super().__init__(f"{error} after {attempts} attempts")
+        self.error = error # Class name of the last backend error
+        self.attempts = attempts
 
 class TranslationService:
+    # Configuration
+    MAX_WORKERS = 8
+    CHUNK_SIZE = 100
+    CACHE_SIZE = 50000
+    # Distributed jobs: work items per shard, bounded by source characters
+    SHARD_SIZE = 500
+    SHARD_CHARS = 200000
+
+    # Used for ETA estimates until real backend calls have been measured
+    DEFAULT_CALL_SECONDS = 1.0
+
+    # Pacing: random pause before each backend call, exponential backoff on errors
+    JITTER_SECONDS = (0.1, 0.5)
+    BACKOFF_SECONDS = 1.0
+
     def __init__(self):
+        # (target, segment) -> translated segment, shared by all tasks
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        # (chars, seconds) of recent successful backend calls
+        self.recent_calls = deque(maxlen=200)
+        self._local = threading.local()
+        # target -> translator; swapped for a fake backend in benchmarks
+        self.translator_factory = lambda target: GoogleTranslator(source='auto', target=target)
+        # task_id -> (first row, last row) to translate next, see set_priority
+        self.priorities = {}
+        self.priority_lock = threading.Lock()
+        # Task ids with a translation loop in this process, see reserve_task
+        self.active_tasks = set()
+        self.active_lock = threading.Lock()
         print("TranslationService initialized.")
 
     def initialize(self):
         # No specific initialization needed for deep-translator
         pass
 
-    def translate_text_with_retry(self, text, retries=5, custom_patterns=None):
+    # --- CACHE ---
+    def cache_get(self, content, target='vi'):
+        with self.cache_lock:
+            key = (target, content)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                metrics.CACHE_LOOKUPS.inc(result="hit")
+                return self.cache[key]
+        metrics.CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def cache_peek(self, content, target='vi'):
+        """
+        Cache lookup for planning: no metrics and no LRU reordering.
+        """
+        with self.cache_lock:
+            return self.cache.get((target, content))
+
+    def cache_put(self, content, translated, target='vi'):
+        with self.cache_lock:
+            self.cache[(target, content)] = translated
+            self.cache.move_to_end((target, content))
+            while len(self.cache) > self.CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+    # --- SCHEDULING ---
+    def set_priority(self, task_id, start_row, end_row):
+        """
+        Asks a task to translate rows start_row..end_row (inclusive) next,
+        e.g. the rows visible in the grid. Takes effect at the next chunk
+        without restarting the task; once those rows are done the task goes
+        back to its own order. A new hint replaces the previous one.
+        Returns False (and keeps nothing) unless the task is running or paused.
+        """
+        from progress_tracker import progress_tracker
+
+        # Checked under the lock: a task ends by setting its status, then
+        # clearing its hint, so no hint outlives its task
+        with self.priority_lock:
+            if progress_tracker.get_status(task_id) not in ("running", "paused"):
+                return False
+            self.priorities[task_id] = (min(start_row, end_row), max(start_row, end_row))
+            return True
+
+    def reserve_task(self, task_id):
+        """
+        Claims a task id for a translation loop about to be queued. Returns
+        False if a loop for it is already queued or running in this process.
+        """
+        with self.active_lock:
+            if task_id in self.active_tasks:
+                return False
+            self.active_tasks.add(task_id)
+            return True
+
+    def is_active(self, task_id):
+        with self.active_lock:
+            return task_id in self.active_tasks
+
+    def clear_priority(self, task_id):
+        with self.priority_lock:
+            self.priorities.pop(task_id, None)
+
+    def next_chunk(self, task_id, work_items, row_positions, done, cursor):
+        """
+        Returns the indices of the next work items to dispatch: pending items
+        of the hinted rows if any, else the next pending items from cursor on.
+        row_positions: {row: [work item index]}
+        done: Flags of dispatched work items (items before cursor are all done).
+        """
+        with self.priority_lock:
+            hint = self.priorities.get(task_id)
+        if hint:
+            start, end = hint
+            if end - start < len(row_positions):
+                rows = range(start, end + 1)
+            else:
+                rows = sorted(row for row in row_positions if start <= row <= end)
+            chunk = []
+            for row in rows:
+                chunk.extend(i for i in row_positions.get(row, ()) if i >= cursor and not done[i])
+                if len(chunk) >= self.CHUNK_SIZE:
+                    break
+            if chunk:
+                return chunk
+            # Hinted rows are done: resume the background order
+            with self.priority_lock:
+                if self.priorities.get(task_id) == hint:
+                    del self.priorities[task_id]
+
+        chunk = []
+        i = cursor
+        while i < len(work_items) and len(chunk) < self.CHUNK_SIZE:
+            if not done[i]:
+                chunk.append(i)
+            i += 1
+        return chunk
+
+    # --- PREPARATION ---
+    def load_settings(self, targets=('vi',)):
+        """
+        Returns (pre_glossaries, post_glossaries, protected_patterns) from Firebase.
+        Glossaries are dicts keyed by target language; terms without a 'lang'
+        apply to every target.
+        """
+        from firebase_service import firebase_service
+
+        glossary = firebase_service.get_glossary()
+        pre_glossaries = {}
+        post_glossaries = {}
+        for target in targets:
+            terms = [item for item in glossary if item.get('lang') in (None, '', target)]
+            pre_glossaries[target] = {item['term']: item['translation'] for item in terms if item.get('type') == 'pre'}
+            post_glossaries[target] = {item['term']: item['translation'] for item in terms if item.get('type') == 'post'}
+        protected_patterns = firebase_service.get_protected_patterns()
+        return pre_glossaries, post_glossaries, protected_patterns
+
+    def build_work_items(self, df, rows, columns, cells=None):
+        """
+        Returns [(row_idx, col, text)] for every non-blank selected cell.
+        cells: Optional set of (row_idx, col) further restricting rows x columns.
+        """
+        work_items = []
+        for row_idx in rows:
+            for col in columns:
+                if cells is not None and (row_idx, col) not in cells:
+                    continue
+                # Only add if valid
+                if row_idx < len(df) and col in df.columns:
+                    val = str(df.at[row_idx, col])
+                    if val.strip():
+                        work_items.append((row_idx, col, val))
+        return work_items
+
+    def classify_cells(self, df, rows, columns, targets, cells=None):
+        """
+        Runs the local pre-dispatch classifier over the selection.
+        Returns (skip_reasons, skipped_columns) where skip_reasons maps
+        (row, col) -> {target: reason} for outputs that are passed through
+        instead of translated: numbers, ids, URLs, emails and code skip every
+        target, text already in a target language skips that target.
+        A None reason (see prepare_task) leaves the output untouched.
+        """
+        from cell_classifier import cell_classifier
+
+        with metrics.PREPROCESS_CPU_SECONDS.cpu_time(stage="classify"):
+            skipped, languages, skipped_columns = cell_classifier.classify(df, rows, columns)
+
+        if cells is not None:
+            skipped = {key: reason for key, reason in skipped.items() if key in cells}
+            languages = {key: lang for key, lang in languages.items() if key in cells}
+
+        skip_reasons = {key: {target: reason for target in targets} for key, reason in skipped.items()}
+        for key, lang in languages.items():
+            for target in targets:
+                if target.split('-')[0].lower() == lang:
+                    skip_reasons[key] = {target: 'target_language'}
+        return skip_reasons, skipped_columns
+
+    @staticmethod
+    def count_skipped(skip_reasons):
+        counts = {}
+        for by_target in skip_reasons.values():
+            for reason in by_target.values():
+                if reason is not None:
+                    counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+    @staticmethod
+    def output_column(col, target):
+        return f"{col}_{target}"
+
+    @staticmethod
+    def apply_glossary(text, glossary):
+        for term, trans in glossary.items():
+            text = text.replace(term, trans)
+        return text
+
+    def prepare_text(self, text, pre_glossaries, custom_patterns=None):
+        """
+        Applies each target's pre-glossary and splits the result into packed
+        segments. Returns {target: segments}; targets whose glossary yields the
+        same text share one split.
+        """
+        from text_preprocessor import TextPreprocessor
+
+        prepared = {}
+        splits = {}
+        for target, pre_glossary in pre_glossaries.items():
+            with metrics.PREPROCESS_CPU_SECONDS.cpu_time(stage="glossary"):
+                pre_text = self.apply_glossary(text, pre_glossary)
+            if pre_text not in splits:
+                with metrics.PREPROCESS_CPU_SECONDS.cpu_time(stage="split"):
+                    splits[pre_text] = TextPreprocessor.split(pre_text, custom_patterns, max_length=TextPreprocessor.MAX_SEGMENT_LENGTH)
+            prepared[target] = splits[pre_text]
+        return prepared
+
+    @staticmethod
+    def is_translatable(segment):
+        return segment['type'] == 'text' and bool(segment['content'].strip())
+
+    def plan_translation(self, df, rows, columns, targets=('vi',)):
+        """
+        Dry run of run_translation_task: builds work items, applies the glossary,
+        splits, dedups and checks the cache without calling the backend.
+        """
+        pre_glossaries, _, protected_patterns = self.load_settings(targets)
+        work_items = self.build_work_items(df, rows, columns)
+        skip_reasons, skipped_columns = self.classify_cells(df, rows, columns, targets)
+
+        segment_count = 0
+        protected_count = 0
+        translatable_count = 0
+        total_chars = 0
+        translatable_chars = 0
+        unique = {} # (target, segment) -> length
+        for row, col, text in work_items:
+            skip = skip_reasons.get((row, col), {})
+            glossaries = {target: g for target, g in pre_glossaries.items() if target not in skip}
+            if not glossaries:
+                continue
+            total_chars += len(text)
+            seen = set()
+            for target, segments in self.prepare_text(text, glossaries, protected_patterns).items():
+                for segment in segments:
+                    content = segment['content']
+                    if id(segments) not in seen:
+                        # Count the split once, however many targets share it
+                        segment_count += 1
+                        if segment['type'] == 'non_text':
+                            protected_count += 1
+                        if self.is_translatable(segment):
+                            translatable_count += 1
+                            translatable_chars += len(content)
+                    if self.is_translatable(segment):
+                        unique[(target, content)] = len(content)
+                seen.add(id(segments))
+
+        misses = {key: n for key, n in unique.items() if self.cache_peek(key[1], key[0]) is None}
+        cache_hits = len(unique) - len(misses)
+        requests = len(misses)
+
+        calls = list(self.recent_calls)
+        if calls:
+            call_seconds = sum(s for _, s in calls) / len(calls)
+            chars_per_second = sum(c for c, _ in calls) / max(sum(s for _, s in calls), 1e-9)
+        else:
+            call_seconds = self.DEFAULT_CALL_SECONDS
+            chars_per_second = None
+        # Every call also pays the pacing jitter, which recent_calls doesn't time
+        call_seconds += sum(self.JITTER_SECONDS) / 2
+
+        skipped = self.count_skipped(skip_reasons)
+        return {
+            "cells": len(work_items),
+            "targets": list(targets),
+            "skipped_items": sum(skipped.values()),
+            "skipped": skipped,
+            "skipped_columns": skipped_columns,
+            "segments": segment_count,
+            "protected_segments": protected_count,
+            "translatable_segments": translatable_count,
+            "unique_segments": len(unique),
+            "total_chars": total_chars,
+            "translatable_chars": translatable_chars,
+            "request_chars": sum(misses.values()),
+            "estimated_requests": requests,
+            "cache_hits": cache_hits,
+            "cache_hit_ratio": cache_hits / len(unique) if unique else 0.0,
+            "measured_calls": len(calls),
+            "avg_call_seconds": call_seconds,
+            "backend_chars_per_second": chars_per_second,
+            "eta_seconds": requests * call_seconds / self.MAX_WORKERS,
+        }
+
+    # --- TRANSLATION ---
+    def _get_translator(self, target='vi'):
+        # One translator per thread and target language
+        translators = getattr(self._local, 'translators', None)
+        if translators is None:
+            translators = self._local.translators = {}
+        if target not in translators:
+            translators[target] = self.translator_factory(target)
+        return translators[target]
+
+    def translate_text_with_retry(self, text, retries=5, custom_patterns=None, target='vi'):
         """
         Translates a single text block with retry logic and smart splitting.
-        Thread-safe: Creates its own Translator instance.
+        Thread-safe: Uses a per-thread Translator instance.
         """
         if not text or not text.strip():
             return text
 
         # Lazy import
-        from text_preprocessor import TextPreprocessor 
+        from text_preprocessor import TextPreprocessor
 
-        # 1. Split text
-        segments = TextPreprocessor.split(text, custom_patterns)
+        # 1. Split text into right-sized segments
+        segments = TextPreprocessor.split(text, custom_patterns, max_length=TextPreprocessor.MAX_SEGMENT_LENGTH)
         final_translated_text = ""
-        
-        # Create a dedicated translator for this thread/task
-        translator = GoogleTranslator(source='auto', target='vi')
 
         for segment in segments:
-            content = segment['content']
-            
-            # Skip non-text or empty
-            if segment['type'] == 'non_text':
-                final_translated_text += content
+            if not self.is_translatable(segment):
+                final_translated_text += segment['content']
                 continue
-            if not content.strip():
-                final_translated_text += content
+
+            try:
+                result = self.translate_segment(segment, target, retries=retries)
+            except SegmentFailed:
+                # All attempts failed, keep original
+                result = segment['content']
+            final_translated_text += result
+
+        return final_translated_text
+
+    def translate_segment(self, segment, target='vi', retries=5):
+        """
+        Translates one translatable segment, going through the cache.
+        Raises SegmentFailed if every attempt fails.
+        """
+        content = segment['content']
+        cached = self.cache_get(content, target)
+        if cached is not None:
+            return cached
+
+        translator = self._get_translator(target)
+        result = self._translate_segment(translator, content, retries, target)
+
+        # A packed segment must come back with the same line structure,
+        # otherwise fall back to translating its lines one by one.
+        if 'parts' in segment and not self._same_newlines(content, result):
+            pieces = []
+            for part in segment['parts']:
+                piece = part['content']
+                if piece.strip():
+                    piece = self._translate_segment(translator, piece, retries, target)
+                pieces.append(piece)
+            result = "".join(pieces)
+
+        self.cache_put(content, result, target)
+        return result
+
+    def _translate_segment(self, translator, content, retries, target='vi'):
+        """
+        Sends one segment to the backend. Raises SegmentFailed if every attempt fails.
+        Surrounding whitespace is kept from the source, since the backend trims it.
+        """
+        stripped = content.strip()
+        lead = content[:len(content) - len(content.lstrip())]
+        trail = content[len(content.rstrip()):]
+        metrics.SEGMENT_CHARS.observe(len(stripped))
+
+        last_error = None
+        for attempt in range(retries):
+            # Add a tiny jitter
+            time.sleep(random.uniform(*self.JITTER_SECONDS))
+
+            started = time.perf_counter()
+            try:
+                result = translator.translate(stripped)
+                elapsed = time.perf_counter() - started
+                metrics.BACKEND_CALL_SECONDS.observe(elapsed, target=target, outcome="ok")
+                metrics.SEGMENT_RETRIES.observe(attempt, outcome="ok")
+                self.recent_calls.append((len(stripped), elapsed))
+                return lead + (result or "") + trail
+            except Exception as e:
+                metrics.BACKEND_CALL_SECONDS.observe(time.perf_counter() - started, target=target, outcome="error")
+                last_error = e
+                if attempt < retries - 1:
+                    sleep_time = self.BACKOFF_SECONDS * ((2 ** attempt) + random.uniform(0, 1))
+                    time.sleep(sleep_time)
+        metrics.SEGMENT_RETRIES.observe(retries - 1, outcome="failed")
+        raise SegmentFailed(type(last_error).__name__, retries)
+
+    @staticmethod
+    def _same_newlines(source, translated):
+        return re.findall(r'\n+', source) == re.findall(r'\n+', translated)
+
+    # --- DISTRIBUTED ---
+    def prepare_task(self, df, rows, columns, dataset_id=None, target_languages=None, cells=None, outputs=None):
+        """
+        Work shared by local and distributed runs: resolves the targets,
+        records the translation on the dataset (adding per-language output
+        columns), builds the work items and classifies cells to pass through.
+        outputs: Optional list of (row, col, target) to translate instead of
+            every target of each cell; the other outputs are left untouched.
+        Returns (in_place, targets, work_items, skip_reasons, skipped,
+        skipped_columns, total_items).
+        """
+        from firebase_service import firebase_service
+
+        requested = None
+        if outputs is not None:
+            requested = {}
+            for row, col, target in outputs:
+                requested.setdefault((row, col), set()).add(target)
+            cells = list(requested)
+        if cells is not None:
+            cells = {(row, col) for row, col in cells}
+            rows = sorted({row for row, _ in cells})
+            columns = list(dict.fromkeys(col for _, col in cells))
+
+        in_place = not target_languages
+        targets = ['vi'] if in_place else list(dict.fromkeys(target_languages))
+
+        work_items = self.build_work_items(df, rows, columns, cells)
+
+        if dataset_id:
+            firebase_service.record_translation(dataset_id, columns, target_languages)
+        if dataset_id and not in_place:
+            output_columns = [self.output_column(col, target) for col in columns for target in targets]
+            firebase_service.add_columns(dataset_id, output_columns)
+
+        # Cells that need no backend call are passed through
+        skip_reasons, skipped_columns = self.classify_cells(df, rows, columns, targets, cells)
+        excluded = 0
+        if requested is not None:
+            # Neither translated nor passed through, e.g. the targets of a
+            # retried cell that did not fail
+            for key, wanted in requested.items():
+                for target in targets:
+                    if target not in wanted:
+                        skip_reasons.setdefault(key, {})[target] = None
+                        excluded += 1
+        skipped = self.count_skipped(skip_reasons)
+
+        # One progress item per cell and target language
+        total_items = len(work_items) * len(targets) - sum(skipped.values()) - excluded
+        return in_place, targets, work_items, skip_reasons, skipped, skipped_columns, total_items
+
+    def create_distributed_job(self, task_id, df, rows, columns, dataset_id=None, target_languages=None, cells=None):
+        """
+        Splits a translation into shards in the shard store, for any number of
+        worker processes (see worker.py) to claim. Same arguments as
+        run_translation_task; progress is read back from the store.
+        """
+        from progress_tracker import progress_tracker
+        from shard_store import get_shard_store
+
+        store = get_shard_store()
+        in_place, targets, work_items, skip_reasons, skipped, skipped_columns, total_items = self.prepare_task(
+            df, rows, columns, dataset_id, target_languages, cells
+        )
+
+        shards = []
+        shard, chars = [], 0
+        for row, col, text in work_items:
+            if shard and (len(shard) >= self.SHARD_SIZE or chars + len(text) > self.SHARD_CHARS):
+                shards.append(shard)
+                shard, chars = [], 0
+            shard.append([int(row), col, text, skip_reasons.get((row, col), {})])
+            chars += len(text)
+        if shard:
+            shards.append(shard)
+
+        store.create_job(task_id, dataset_id, targets, in_place, shards, total_items, skipped)
+
+        # The local tracker only records the hand-off; /progress reads the store
+        progress_tracker.init_task(task_id, total_items, dataset_id=dataset_id)
+        progress_tracker.set_skipped(task_id, skipped, skipped_columns)
+        progress_tracker.update_status(task_id, "distributed")
+        print(f"Task {task_id}: {total_items} items in {len(shards)} shards.")
+
+    def translate_chunk(self, chunk_items, skip_reasons, settings, in_place, write,
+                        on_done, on_failed, should_stop=lambda: False):
+        """
+        Translates one chunk of work items [(row, col, text)] to every target
+        of settings (pre_glossaries, post_glossaries, protected_patterns).
+        skip_reasons: {(row, col): {target: reason}} outputs passed through,
+            or left untouched for a None reason.
+        write(row, col, value): Stores a finished output.
+        on_done(chars): Called for every written (cell, target) output.
+        on_failed(row, col, output_col, target, error, attempts, segments):
+            Called instead for outputs with a segment that failed every retry.
+        should_stop(): Checked as segments complete; True abandons the chunk.
+        Returns the positions in chunk_items of the items whose outputs were
+        all finished (written or failed); a stop leaves the others out.
+        """
+        pre_glossaries, post_glossaries, protected_patterns = settings
+
+        # Split every cell once, then group the (cell, target) outputs by
+        # the (target, segment) pairs they still need
+        cells = []
+        results = {} # (target, segment content) -> translation
+        failures = {} # (target, segment content) -> (error class, attempts)
+        waiting = {} # (target, segment content) -> [cell index]
+        segment_of = {}
+        passthrough = [] # (row, output column, source text)
+        unfinished = [0] * len(chunk_items) # outputs left per item
+        for position, (row, col, text) in enumerate(chunk_items):
+            skip = skip_reasons.get((row, col), {})
+            if not in_place:
+                passthrough.extend((row, self.output_column(col, target), text)
+                                   for target, reason in skip.items() if reason is not None)
+            glossaries = {target: g for target, g in pre_glossaries.items() if target not in skip}
+            if not glossaries:
                 continue
+            for target, segments in self.prepare_text(text, glossaries, protected_patterns).items():
+                out_col = col if in_place else self.output_column(col, target)
+                cell = {"row": row, "col": out_col, "source_col": col, "target": target,
+                        "chars": len(text), "segments": segments, "pending": 0, "item": position}
+                unfinished[position] += 1
+                for segment in segments:
+                    key = (target, segment['content'])
+                    if not self.is_translatable(segment) or key in results:
+                        continue
+                    cached = self.cache_get(segment['content'], target)
+                    if cached is not None:
+                        results[key] = cached
+                        continue
+                    if key not in waiting:
+                        waiting[key] = []
+                        segment_of[key] = segment
+                    waiting[key].append(len(cells))
+                    cell["pending"] += 1
+                cells.append(cell)
 
-            # Retry loop for the segment
-            segment_translated = False
-            for attempt in range(retries):
-                try:
-                    # Add a tiny jitter
-                    time.sleep(random.uniform(0.1, 0.5))
-                    
-                    result = translator.translate(content)
-                    final_translated_text += result
-                    segment_translated = True
+        def finish(cell):
+            unfinished[cell["item"]] -= 1
+            target = cell["target"]
+            failed = [failures[(target, segment['content'])] for segment in cell["segments"]
+                      if (target, segment['content']) in failures]
+            if failed:
+                # Neither written nor counted: the ledger feeds /translate/retry-failed
+                error, attempts = failed[0]
+                on_failed(cell["row"], cell["source_col"], cell["col"], target,
+                          error, max(a for _, a in failed), len(failed))
+                metrics.CELLS_FAILED.inc(error=error)
+                return
+
+            translated_text = ""
+            for segment in cell["segments"]:
+                content = segment['content']
+                if self.is_translatable(segment):
+                    content = results[(target, content)]
+                translated_text += content
+
+            # Apply Post-Glossary
+            with metrics.PREPROCESS_CPU_SECONDS.cpu_time(stage="post_glossary"):
+                translated_text = self.apply_glossary(translated_text, post_glossaries[target])
+
+            write(cell["row"], cell["col"], translated_text)
+            metrics.CELLS_TRANSLATED.inc()
+            metrics.CHARS_TRANSLATED.inc(cell["chars"])
+            on_done(cell["chars"])
+
+        # Skipped outputs get the source text as is
+        for row, col, text in passthrough:
+            write(row, col, text)
+
+        # Cells fully served by the cache are done straight away
+        for cell in cells:
+            if cell["pending"] == 0:
+                finish(cell)
+
+        # Execute unique segments in parallel
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            future_to_key = {
+                executor.submit(self.translate_segment, segment_of[key], key[0], retries=5): key
+                for key in waiting
+            }
+            metrics.QUEUE_DEPTH.inc(len(future_to_key))
+            in_flight = len(future_to_key)
+
+            for future in concurrent.futures.as_completed(future_to_key):
+                if should_stop():
                     break
+
+                key = future_to_key[future]
+                metrics.QUEUE_DEPTH.dec()
+                in_flight -= 1
+                try:
+                    results[key] = future.result()
+                except SegmentFailed as e:
+                    failures[key] = (e.error, e.attempts)
                 except Exception as e:
-                    # print(f"Retry {attempt+1}/{retries} for segment: {e}")
-                    if attempt < retries - 1:
-                        sleep_time = (2 ** attempt) + random.uniform(0, 1)
-                        time.sleep(sleep_time)
-                    else:
-                        # Final attempt failed, keep original
-                        final_translated_text += content
-        
-        return final_translated_text
+                    print(f"Error in thread for segment - {e}")
+                    failures[key] = (type(e).__name__, 1)
+
+                for cell_index in waiting[key]:
+                    cell = cells[cell_index]
+                    cell["pending"] -= 1
+                    if cell["pending"] == 0:
+                        finish(cell)
+
+        # Futures abandoned by a stop are no longer queued
+        metrics.QUEUE_DEPTH.dec(in_flight)
+        return [position for position, left in enumerate(unfinished) if left == 0]
 
-    def run_translation_task(self, task_id, df, rows, columns, dataset_id=None):
+    def run_translation_task(self, task_id, df, rows, columns, dataset_id=None, target_languages=None, cells=None,
+                             outputs=None):
         """
         Runs the translation task using a ThreadPool for maximum speed.
+        Each cell is segmented once and every segment is fanned out to all
+        target languages; identical (target, segment) pairs within a chunk are
+        sent to the backend once.
+        Without target_languages, cells are translated to Vietnamese in place.
+        Otherwise each target is written to its own column (see output_column).
         Writes results to Firebase if dataset_id is provided.
+        cells: Optional list of (row, col) to translate instead of rows x columns.
+        outputs: Optional list of (row, col, target) to translate instead of cells.
         """
+        # Callers queueing the task reserve it first (reserve_task)
+        with self.active_lock:
+            self.active_tasks.add(task_id)
+        try:
+            self._run_translation_task(task_id, df, rows, columns, dataset_id, target_languages, cells, outputs)
+        finally:
+            with self.active_lock:
+                self.active_tasks.discard(task_id)
+
+    def _run_translation_task(self, task_id, df, rows, columns, dataset_id, target_languages, cells, outputs):
         from progress_tracker import progress_tracker
         from firebase_service import firebase_service
-        import time
 
-        # Fetch Glossary
-        glossary = firebase_service.get_glossary()
-        pre_glossary = {item['term']: item['translation'] for item in glossary if item.get('type') == 'pre'}
-        post_glossary = {item['term']: item['translation'] for item in glossary if item.get('type') == 'post'}
+        in_place, targets, work_items, skip_reasons, skipped, skipped_columns, total_items = self.prepare_task(
+            df, rows, columns, dataset_id, target_languages, cells, outputs
+        )
 
-        # Fetch Protected Patterns
-        protected_patterns = firebase_service.get_protected_patterns()
+        # Fetch Glossary and Protected Patterns
+        settings = self.load_settings(targets)
 
-        # Calculate total work
-        work_items = []
-        for row_idx in rows:
-            for col in columns:
-                # Only add if valid
-                if row_idx < len(df) and col in df.columns:
-                    val = str(df.at[row_idx, col])
-                    if val.strip():
-                        work_items.append((row_idx, col, val))
+        # Identifies the work, so a rerun of an interrupted task resumes it
+        work = [dataset_id, targets, [[row, col] for row, col, _ in work_items]]
+        if outputs is not None:
+            work.append(sorted([row, col, target] for row, col, target in outputs))
+        fingerprint = hashlib.sha1(json.dumps(work, default=str).encode('utf-8')).hexdigest()
+        start_index = progress_tracker.init_task(task_id, total_items, fingerprint, dataset_id)
+        progress_tracker.set_skipped(task_id, skipped, skipped_columns)
+        # Hints given to an earlier run of this task id don't carry over
+        self.clear_priority(task_id)
 
-        total_items = len(work_items)
-        progress_tracker.init_task(task_id, total_items)
-        
         print(f"Starting task {task_id} with {total_items} items. Using Multi-threading.")
-
-        task_state = progress_tracker.get_task(task_id)
-        start_index = 0
-        if task_state and task_state.get("current_index", 0) > 0:
-            start_index = task_state["current_index"]
+        if start_index > 0:
             print(f"Resuming task {task_id} from index {start_index}")
+            # Recount what lies before the resume point; the rest runs again
+            resumed = {(row, col) for row, col, _ in work_items[:start_index]}
+            failed = {(item["row"], item["col"], item["target"]) for item in progress_tracker.get_failures(task_id)
+                      if (item["row"], item["col"]) in resumed}
+            processed = chars = 0
+            for row, col, text in work_items[:start_index]:
+                skip = skip_reasons.get((row, col), {})
+                written = sum(1 for target in targets if target not in skip and (row, col, target) not in failed)
+                processed += written
+                chars += written * len(text)
+            progress_tracker.rebase_task(task_id, processed, chars,
+                                         lambda item: (item["row"], item["col"]) in resumed)
 
-        # Configuration
-        MAX_WORKERS = 8 
-        processed_count = start_index
-        CHUNK_SIZE = 100 
         current_idx = start_index
-        
-        while current_idx < total_items:
-            # Check Status
-            status = progress_tracker.get_status(task_id)
-            if status == "paused":
-                time.sleep(1)
-                continue
-            if status == "stopped":
-                print(f"Task {task_id} stopped.")
-                break
-
-            # Prepare chunk
-            end_idx = min(current_idx + CHUNK_SIZE, total_items)
-            chunk_items = work_items[current_idx:end_idx]
-            
-            # Execute chunk in parallel
-            with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                # Map future -> (row, col, original_text)
-                future_to_item = {}
-                for item in chunk_items:
-                    row, col, text = item
-                    
-                    # Apply Pre-Glossary
-                    for term, trans in pre_glossary.items():
-                        text = text.replace(term, trans)
-                        
-                    future = executor.submit(self.translate_text_with_retry, text, retries=5, custom_patterns=protected_patterns)
-                    future_to_item[future] = (row, col)
-                
-                for future in concurrent.futures.as_completed(future_to_item):
-                    if progress_tracker.get_status(task_id) == "stopped":
-                        break
-                        
-                    row, col = future_to_item[future]
-                    try:
-                        translated_text = future.result()
-                        
-                        # Apply Post-Glossary
-                        for term, trans in post_glossary.items():
-                            translated_text = translated_text.replace(term, trans)
-                        
-                        # Update DataFrame (for local consistency if needed)
-                        df.at[row, col] = translated_text
-                        
-                        # Update Firebase
-                        if dataset_id:
-                            firebase_service.update_cell(dataset_id, row, col, translated_text)
-                            
-                    except Exception as e:
-                        print(f"Error in thread for {row}:{col} - {e}")
-                    
-                    processed_count += 1
-                    if processed_count % 5 == 0 or processed_count == total_items:
-                        progress_tracker.update_progress(task_id, processed_count, processed_count)
-
-            current_idx = end_idx
-            progress_tracker.update_progress(task_id, processed_count, processed_count)
-
-        progress_tracker.update_status(task_id, "completed")
-        print(f"Task {task_id} completed.")
+        # Work items can be dispatched out of order for priority hints;
+        # current_idx stays the point before which everything is done
+        done = bytearray(len(work_items))
+        done[:start_index] = b'\x01' * start_index
+        row_positions = {}
+        for i, (row, _, _) in enumerate(work_items):
+            row_positions.setdefault(row, []).append(i)
+
+        def write(row, col, value):
+            try:
+                # Update DataFrame (for local consistency if needed)
+                df.at[row, col] = value
+
+                # Update Firebase
+                if dataset_id:
+                    firebase_service.update_cell(dataset_id, row, col, value)
+            except Exception as e:
+                print(f"Error writing {row}:{col} - {e}")
+
+        outcome = "completed"
+        try:
+            while current_idx < len(work_items):
+                # Check Status
+                status = progress_tracker.get_status(task_id)
+                if status == "paused":
+                    time.sleep(1)
+                    continue
+                if status == "stopped":
+                    print(f"Task {task_id} stopped.")
+                    outcome = "stopped"
+                    break
+
+                # Prepare chunk: hinted (visible) rows first, then background order
+                chunk_indices = self.next_chunk(task_id, work_items, row_positions, done, current_idx)
+                chunk_items = [work_items[i] for i in chunk_indices]
+
+                finished = self.translate_chunk(
+                    chunk_items, skip_reasons, settings, in_place, write,
+                    # In-memory counter; persisted by the tracker's flusher
+                    on_done=lambda chars: progress_tracker.increment(task_id, 1, chars),
+                    on_failed=lambda *failure: progress_tracker.record_failure(task_id, *failure),
+                    should_stop=lambda: progress_tracker.get_status(task_id) == "stopped"
+                )
+
+                # Only finished items count as done: a stop mid-chunk leaves
+                # the rest to a later run
+                for position in finished:
+                    done[chunk_indices[position]] = 1
+                while current_idx < len(work_items) and done[current_idx]:
+                    current_idx += 1
+                progress_tracker.set_current_index(task_id, current_idx)
+                if len(finished) < len(chunk_indices):
+                    print(f"Task {task_id} stopped.")
+                    outcome = "stopped"
+                    break
+        except Exception:
+            outcome = "failed"
+            raise
+        finally:
+            # Final status first, then the hint, so no hint outlives the task
+            progress_tracker.finish_task(task_id, outcome)
+            self.clear_priority(task_id)
+            print(f"Task {task_id} {outcome}.")
 
 # Singleton instance
 try:
@@ -174,4 +775,4 @@ try:
 except Exception as e:
     print(f"CRITICAL ERROR initializing TranslationService: {e}")
     traceback.print_exc()
-    translation_service = None
\ No newline at end of file
+    translation_service = None
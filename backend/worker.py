@@ -0,0 +1,139 @@
+"""
+Worker process for distributed translation jobs.
+
+Claims shards from the shard store under an expiring lease, translates them
+with the regular pipeline and writes the results. The lease is renewed by
+heartbeats while a shard is processed; if a worker dies, its lease expires
+and another worker reclaims the shard. Run as many as needed, on any node
+(from backend/):
+
+    python worker.py
+    SHARD_STORE=sqlite:///shards.db python worker.py --exit-when-idle
+
+--fake-latency swaps the translation backend for benchmarks.fakes, to try
+several workers locally without network access.
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+import uuid
+
+from shard_store import get_shard_store
+from translation_service import translation_service
+
+class ShardWorker:
+    LEASE_SECONDS = 60
+    HEARTBEAT_SECONDS = 15
+    IDLE_SECONDS = 2
+
+    def __init__(self, store, worker_id=None):
+        self.store = store
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.jobs = {} # task_id -> (created_at, settings) of the job last seen
+
+    def run(self, exit_when_idle=False):
+        print(f"Worker {self.worker_id} started.")
+        while True:
+            shard = self.store.claim(self.worker_id, self.LEASE_SECONDS)
+            if shard is None:
+                # Shards leased by others may still come back if their worker dies
+                if exit_when_idle and not self.store.has_work():
+                    print(f"Worker {self.worker_id}: no work left.")
+                    return
+                time.sleep(self.IDLE_SECONDS)
+                continue
+            try:
+                self.process(shard)
+            except Exception as e:
+                # The lease runs out and the shard is retried elsewhere
+                print(f"Worker {self.worker_id}: shard {shard['task_id']}/{shard['shard_id']} failed - {e}")
+
+    def load_job(self, task_id):
+        """
+        Returns (job, settings). The job is read for every shard, since a
+        task id can be reused for a new job; settings (glossaries, protected
+        patterns) are loaded once per job.
+        """
+        job = self.store.get_job(task_id)
+        cached = self.jobs.get(task_id)
+        if cached is None or cached[0] != job["created_at"]:
+            cached = self.jobs[task_id] = (job["created_at"], translation_service.load_settings(job["targets"]))
+        return job, cached[1]
+
+    def process(self, shard):
+        job, settings = self.load_job(shard["task_id"])
+        items = [(row, col, text) for row, col, text, _ in shard["items"]]
+        skip_reasons = {(row, col): skip for row, col, _, skip in shard["items"]}
+
+        lost = threading.Event()
+        stopped = threading.Event()
+
+        def heartbeat():
+            while not stopped.wait(self.HEARTBEAT_SECONDS):
+                if not self.store.heartbeat(shard, self.LEASE_SECONDS):
+                    print(f"Worker {self.worker_id}: lease on shard {shard['shard_id']} lost.")
+                    lost.set()
+                    return
+
+        beat = threading.Thread(target=heartbeat, daemon=True)
+        beat.start()
+
+        processed = 0
+        failed = []
+        try:
+            for start in range(0, len(items), translation_service.CHUNK_SIZE):
+                if lost.is_set():
+                    return
+                values = []
+
+                def on_done(chars):
+                    nonlocal processed
+                    processed += 1
+
+                def on_failed(row, col, output_col, target, error, attempts, segments):
+                    failed.append({"row": row, "col": col, "output_col": output_col, "target": target,
+                                   "error": error, "attempts": attempts, "segments": segments})
+
+                translation_service.translate_chunk(
+                    items[start:start + translation_service.CHUNK_SIZE], skip_reasons, settings,
+                    job["in_place"], lambda row, col, value: values.append((row, col, value)),
+                    on_done, on_failed, should_stop=lost.is_set
+                )
+                self.store.write_results(shard, values)
+        finally:
+            stopped.set()
+            beat.join()
+
+        if not lost.is_set() and self.store.complete(shard, processed, failed):
+            print(f"Worker {self.worker_id}: shard {shard['task_id']}/{shard['shard_id']} done "
+                  f"({processed} items, {len(failed)} failed).")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker-id")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Stop once no shard is pending or leased")
+    parser.add_argument("--lease", type=float, default=ShardWorker.LEASE_SECONDS, help="Lease length (s)")
+    parser.add_argument("--heartbeat", type=float, default=ShardWorker.HEARTBEAT_SECONDS, help="Heartbeat interval (s)")
+    parser.add_argument("--fake-latency", type=float, help="Use the offline fake backend with this latency (s)")
+    args = parser.parse_args(argv)
+
+    store = get_shard_store()
+    if store is None:
+        raise SystemExit("No shard store: set SHARD_STORE or configure Firebase.")
+
+    if args.fake_latency is not None:
+        from benchmarks.fakes import FakeTranslatorFactory
+        translation_service.translator_factory = FakeTranslatorFactory(args.fake_latency)
+        translation_service.JITTER_SECONDS = (0, 0)
+
+    worker = ShardWorker(store, args.worker_id)
+    worker.LEASE_SECONDS = args.lease
+    worker.HEARTBEAT_SECONDS = args.heartbeat
+    worker.run(args.exit_when_idle)
+
+
+if __name__ == "__main__":
+    main()
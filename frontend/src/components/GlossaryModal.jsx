@@ -6,6 +6,7 @@ const GlossaryModal = ({ onClose }) => {
     const [newTerm, setNewTerm] = useState("");
     const [newTrans, setNewTrans] = useState("");
     const [newType, setNewType] = useState("pre");
+    const [newLang, setNewLang] = useState("");
 
     useEffect(() => {
         fetchTerms();
@@ -29,7 +30,7 @@ const GlossaryModal = ({ onClose }) => {
             const res = await fetch('http://127.0.0.1:8000/glossary', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ term: newTerm, translation: newTrans, type: newType })
+                body: JSON.stringify({ term: newTerm, translation: newTrans, type: newType, lang: newLang.trim() || null })
             });
             if (res.ok) {
                 setNewTerm("");
@@ -81,6 +82,12 @@ const GlossaryModal = ({ onClose }) => {
                         <option value="pre">Pre-translate (Protect/Replace)</option>
                         <option value="post">Post-translate (Correct)</option>
                     </select>
+                    <input
+                        className="border rounded px-2 py-1 w-24 focus:outline-none focus:ring-1 focus:ring-blue-500"
+                        placeholder="Lang (all)"
+                        value={newLang}
+                        onChange={e => setNewLang(e.target.value)}
+                    />
                     <button
                         onClick={handleAdd}
                         className="bg-blue-600 text-white px-3 py-1 rounded hover:bg-blue-700 active:scale-95 transition-all flex items-center gap-1"
@@ -96,6 +103,7 @@ const GlossaryModal = ({ onClose }) => {
                                 <th className="py-2">Term</th>
                                 <th className="py-2">Translation</th>
                                 <th className="py-2">Type</th>
+                                <th className="py-2">Lang</th>
                                 <th className="py-2 w-10"></th>
                             </tr>
                         </thead>
@@ -109,6 +117,7 @@ const GlossaryModal = ({ onClose }) => {
                                             {item.type === 'pre' ? 'Pre' : 'Post'}
                                         </span>
                                     </td>
+                                    <td className="py-2 text-xs text-gray-500">{item.lang || 'All'}</td>
                                     <td className="py-2 text-right">
                                         <button
                                             onClick={() => handleDelete(item.id)}
@@ -121,7 +130,7 @@ const GlossaryModal = ({ onClose }) => {
                             ))}
                             {terms.length === 0 && (
                                 <tr>
-                                    <td colSpan="4" className="text-center py-8 text-gray-400">
+                                    <td colSpan="5" className="text-center py-8 text-gray-400">
                                         No terms added yet.
                                     </td>
                                 </tr>